@@ -0,0 +1,160 @@
+# acara_store.py — data acara per slot dalam bentuk terstruktur (tabel laporan_acara)
+#
+# Kolom acara_15..acara_18 menyimpan string '{Nama,waktu}; {Nama2,waktu}' dan format_XX
+# 'jenis; jenis'. Filter pagi/sore/nama acara di atas string itu butuh ILIKE '%..%' yang
+# tidak bisa pakai index. Di sini setiap acara disimpan satu baris ber-index, plus kolom
+# laporanx.waktu_siaran (mayoritas pagi/sore, sama seperti label jam di PDF).
+import re
+
+from sqlalchemy import text
+
+RE_ITEM = re.compile(r"^\{\s*(?P<nama>.+?)\s*,\s*(?P<waktu>pagi|sore)\s*\}$", re.IGNORECASE)
+
+SLOTS = ("15", "16", "17", "18")
+
+# jam mulai tiap slot per waktu siaran; slot diberi nama dari jadwal sore
+SLOT_HOURS = {
+    "sore": {"15": 15, "16": 16, "17": 17, "18": 18},
+    "pagi": {"15": 8, "16": 9, "17": 10, "18": 11},
+}
+
+ACARA_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS laporan_acara (
+        laporan_id INTEGER  NOT NULL,
+        slot       SMALLINT NOT NULL,
+        urutan     SMALLINT NOT NULL,
+        nama       TEXT     NOT NULL,
+        format     TEXT,
+        waktu      TEXT,
+        PRIMARY KEY (laporan_id, slot, urutan)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_laporan_acara_waktu ON laporan_acara (waktu, laporan_id)",
+    "CREATE INDEX IF NOT EXISTS idx_laporan_acara_nama ON laporan_acara (lower(nama), laporan_id)",
+    "CREATE INDEX IF NOT EXISTS idx_laporan_acara_format ON laporan_acara (lower(format), laporan_id)",
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS waktu_siaran TEXT",
+    # filter waktu memakai laporan_acara (ada acara pagi/sore), bukan waktu_siaran (mayoritas)
+    "DROP INDEX IF EXISTS idx_laporanx_waktu_siaran",
+    # posisi backfill per nama: laporan tanpa acara (waktu_siaran tetap NULL) tidak diulang
+    """
+    CREATE TABLE IF NOT EXISTS backfill_progress (
+        name    TEXT    PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    )
+    """,
+]
+
+BACKFILL_NAME = "laporan_acara"
+
+
+def only_names(acara_str: str) -> str:
+    """'{Nama,waktu}; {Nama2,waktu}' -> 'Nama; Nama2'"""
+    if not acara_str:
+        return ""
+    parts = [p.strip() for p in str(acara_str).split(";") if p.strip()]
+    names = []
+    for p in parts:
+        m = RE_ITEM.match(p)
+        names.append(m.group("nama") if m else p)
+    return "; ".join(names)
+
+
+def detect_waktu(*acara_list: str) -> str:
+    """Hitung token 'pagi' vs 'sore' dari semua kolom acara, pilih mayoritas. Default 'sore'."""
+    pagi, sore = 0, 0
+    for s in acara_list:
+        if not s:
+            continue
+        for token in [t.strip() for t in s.split(";") if t.strip()]:
+            m = RE_ITEM.match(token)
+            if not m:
+                continue
+            if m.group("waktu").lower() == "pagi":
+                pagi += 1
+            else:
+                sore += 1
+    if pagi > sore:
+        return "pagi"
+    return "sore"
+
+
+def parse_slot(acara_str: str, format_str: str) -> list:
+    """Pasangkan '{Nama,waktu}; ...' dengan 'jenis; ...' -> [(nama, format, waktu), ...]."""
+    if not acara_str:
+        return []
+    acara = [p.strip() for p in str(acara_str).split(";") if p.strip()]
+    formats = [f.strip() for f in str(format_str or "").split(";")]
+    out = []
+    for i, token in enumerate(acara):
+        m = RE_ITEM.match(token)
+        nama = m.group("nama").strip() if m else token
+        waktu = m.group("waktu").lower() if m else None
+        fmt = formats[i] if i < len(formats) and formats[i] not in ("", "-") else None
+        out.append((nama, fmt, waktu))
+    return out
+
+
+def acara_rows(laporan_id: int, row: dict) -> list:
+    rows = []
+    for slot in SLOTS:
+        for urutan, (nama, fmt, waktu) in enumerate(parse_slot(row.get(f"acara_{slot}"), row.get(f"format_{slot}"))):
+            rows.append({
+                "laporan_id": laporan_id, "slot": int(slot), "urutan": urutan,
+                "nama": nama, "format": fmt, "waktu": waktu,
+            })
+    return rows
+
+
+def waktu_siaran_for(row: dict):
+    """Mayoritas pagi/sore; None bila tidak ada acara sama sekali."""
+    acara = [row.get(f"acara_{slot}") for slot in SLOTS]
+    if not any(RE_ITEM.match(t.strip()) for a in acara if a for t in str(a).split(";") if t.strip()):
+        return None
+    return detect_waktu(*acara)
+
+
+def save_acara(conn, laporan_id: int, row: dict):
+    """Tulis ulang baris laporan_acara untuk satu laporan (di transaksi pemanggil)."""
+    conn.execute(text("DELETE FROM laporan_acara WHERE laporan_id = :id"), {"id": laporan_id})
+    rows = acara_rows(laporan_id, row)
+    if rows:
+        conn.execute(text("""
+            INSERT INTO laporan_acara (laporan_id, slot, urutan, nama, format, waktu)
+            VALUES (:laporan_id, :slot, :urutan, :nama, :format, :waktu)
+        """), rows)
+
+
+def backfill(engine, batch: int = 500, restart: bool = False) -> int:
+    """Isi laporan_acara + waktu_siaran untuk laporan lama (waktu_siaran masih NULL).
+    Melanjutkan dari id terakhir yang tercatat di backfill_progress (restart=True: dari awal)."""
+    done = 0
+    cols = ", ".join(f"acara_{s}, format_{s}" for s in SLOTS)
+    with engine.connect() as conn:
+        last_id = 0 if restart else conn.execute(
+            text("SELECT last_id FROM backfill_progress WHERE name = :name"), {"name": BACKFILL_NAME}
+        ).scalar() or 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(f"""
+                SELECT id, {cols}
+                FROM laporanx
+                WHERE waktu_siaran IS NULL AND id > :last_id
+                ORDER BY id
+                LIMIT :n
+            """), {"last_id": last_id, "n": batch}).fetchall()
+            if not rows:
+                return done
+            for r in rows:
+                d = dict(r._mapping)
+                save_acara(conn, d["id"], d)
+                conn.execute(
+                    text("UPDATE laporanx SET waktu_siaran = :w WHERE id = :id"),
+                    {"w": waktu_siaran_for(d), "id": d["id"]}
+                )
+            last_id = rows[-1].id
+            conn.execute(text("""
+                INSERT INTO backfill_progress (name, last_id) VALUES (:name, :last_id)
+                ON CONFLICT (name) DO UPDATE SET last_id = EXCLUDED.last_id
+            """), {"name": BACKFILL_NAME, "last_id": last_id})
+            done += len(rows)
@@ -1,8 +1,53 @@
 # admin_api.py
-from flask import Blueprint, request, jsonify, session
-from sqlalchemy import text
+from datetime import date, datetime
+from flask import Blueprint, Response, request, jsonify, session
+from db_pool import pool_stats
+import image_variants
+import json_stream
+import laporan_events
+import laporan_rollup
+import laporan_search
+from laporan_export import iter_rows, stream_csv, stream_xlsx
+from laporan_repo import (
+    MAX_LIMIT, PageStream, estimate_count, fetch_page, laporan_filter_sql, parse_fields, parse_int,
+    parse_limit,
+)
+from wib import TZ_WIB
 
-def create_admin_api(engine, fmt_wib):
+def _parse_date(v):
+    v = (v or "").strip()
+    return date.fromisoformat(v) if v else None
+
+def _parse_wib(v):
+    """'YYYY-MM-DD HH:MM[:SS]' (WIB) atau ISO dengan offset -> datetime aware."""
+    v = (v or "").strip()
+    if not v:
+        return None
+    dt = datetime.fromisoformat(v)
+    return dt if dt.tzinfo else dt.replace(tzinfo=TZ_WIB)
+
+def _with_variants(items, args):
+    """?variants=thumb,medium -> tambahkan URL varian foto bukti (lihat image_variants.py)."""
+    names = image_variants.parse_variants(args.get("variants"))
+    if not names:
+        return items
+    return (image_variants.add_variants(r, names) for r in items)
+
+def _filter_from_args(args):
+    """Filter bersama /laporan & /laporan/export. ValueError bila tanggal tidak valid."""
+    # waktu ∈ {pagi, sore, all/''}; dari/sampai = tanggal YYYY-MM-DD (inklusif)
+    # acara = nama acara persis (tanpa beda huruf besar/kecil), format = jenis acara
+    # petugas = nama TD / PDU / salah satu petugas transmisi
+    return laporan_filter_sql(
+        _parse_date(args.get("dari")),
+        _parse_date(args.get("sampai")),
+        (args.get("waktu") or "").strip().lower(),
+        acara=(args.get("acara") or "").strip() or None,
+        format_=(args.get("format") or "").strip() or None,
+        petugas=(args.get("petugas") or "").strip() or None,
+    )
+
+def create_admin_api(engine, bulk_pdf=None, ref_cache=None, events=None):
     bp = Blueprint("admin_api", __name__)
 
     @bp.get("/laporan")
@@ -11,47 +56,209 @@ def create_admin_api(engine, fmt_wib):
         if session.get("role") != "admin":
             return jsonify({"error": "Unauthorized"}), 403
 
-        waktu = (request.args.get("waktu") or "").strip().lower()
-        # waktu ∈ {pagi, sore, all/''}
-        base_sql = """
-            SELECT *
-            FROM laporanx
-            /**WHERE**/
-            ORDER BY id DESC
-            LIMIT :limit OFFSET :offset
-        """
-
-        # pagination sederhana (opsional)
-        limit  = max(1, min(int(request.args.get("limit", 200)), 1000))
-        offset = max(0, int(request.args.get("offset", 0)))
-
-        params = {"limit": limit, "offset": offset}
-        where_sql = ""
-
-        # Filter berdasar token ',pagi}' / ',sore}' pada kolom acara_*
-        if waktu in ("pagi", "sore"):
-            token = f"%,{waktu}%"
-            where_sql = """
-            WHERE
-              acara_15 ILIKE :tok OR
-              acara_16 ILIKE :tok OR
-              acara_17 ILIKE :tok OR
-              acara_18 ILIKE :tok
-            """
-            params["tok"] = token
-
-        final_sql = base_sql.replace("/**WHERE**/", where_sql)
+        try:
+            where_sql, params = _filter_from_args(request.args)
+        except ValueError:
+            return jsonify({"error": "Format tanggal harus YYYY-MM-DD"}), 400
+
+        # pagination keyset: ?before_id=<id terakhir halaman sebelumnya>
+        limit = parse_limit(request.args.get("limit"))
+        before_id = parse_int(request.args.get("before_id"))
+        offset = max(0, parse_int(request.args.get("offset")) or 0)
+        fields = parse_fields(request.args.get("fields"))
+
+        if json_stream.wants_stream(request.args) and not offset:
+            # ?stream=1: baris dikirim langsung dari server-side cursor (opsional gzip)
+            page = PageStream(engine, fields, where_sql, params,
+                              before_id=before_id, limit=limit, with_total=True)
+            head = {"limit": limit, "offset": 0, "next_before_id": page.next_before_id,
+                    "total_estimate": page.total_estimate}
+            return json_stream.response(
+                json_stream.iter_object(head, "items", _with_variants(page, request.args)), request,
+                on_close=page.close,
+            )
+
+        with engine.connect() as conn:
+            data, next_before_id = fetch_page(conn, fields, where_sql, params,
+                                              before_id=before_id, limit=limit, offset=offset)
+            total = estimate_count(conn, where_sql, params)
+
+        return jsonify({
+            "items": list(_with_variants(data, request.args)),
+            "limit": limit,
+            "offset": offset,
+            "next_before_id": next_before_id,
+            "total_estimate": total,
+        })
+
+    @bp.get("/laporan/search")
+    def laporan_search_api():
+        # ?q=audio hilang (sintaks websearch) + filter yang sama dengan /laporan; urut relevansi
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        q = (request.args.get("q") or "").strip()
+        if not q:
+            return jsonify({"error": "Parameter q wajib"}), 400
+        try:
+            where_sql, params = _filter_from_args(request.args)
+        except ValueError:
+            return jsonify({"error": "Format tanggal harus YYYY-MM-DD"}), 400
+        limit = parse_limit(request.args.get("limit"), default=50)
+        offset = max(0, parse_int(request.args.get("offset")) or 0)
+        fields = parse_fields(request.args.get("fields"))
+
+        with engine.connect() as conn:
+            items, next_offset = laporan_search.search(conn, q, fields, where_sql, params,
+                                                       limit=limit, offset=offset)
+        return jsonify({"q": q, "items": list(_with_variants(items, request.args)),
+                        "limit": limit, "offset": offset,
+                        "next_offset": next_offset})
+
+    @bp.get("/laporan/changes")
+    def laporan_changes():
+        # Delta untuk dashboard: ?since_id=<id terbesar yang sudah dimiliki>
+        # &since_timestamp_wib=<cursor.since_timestamp_wib dari panggilan sebelumnya>
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        try:
+            since = _parse_wib(request.args.get("since_timestamp_wib"))
+        except ValueError:
+            return jsonify({"error": "since_timestamp_wib harus YYYY-MM-DD HH:MM[:SS]"}), 400
+        since_id = parse_int(request.args.get("since_id"))
+        if since_id is None and since is None:
+            return jsonify({"error": "Parameter since_id atau since_timestamp_wib wajib"}), 400
+        limit = parse_limit(request.args.get("limit"), default=MAX_LIMIT)
+        fields = parse_fields(request.args.get("fields"))
 
         with engine.connect() as conn:
-            rows = conn.execute(text(final_sql), params).fetchall()
+            items, truncated, cursor = laporan_events.fetch_changes(conn, fields, since_id, since, limit)
+        # truncated: terlalu banyak perubahan, dashboard sebaiknya memuat ulang halaman pertama
+        resp = jsonify({"items": list(_with_variants(items, request.args)), "truncated": truncated,
+                        "cursor": cursor})
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+
+    @bp.get("/laporan/events")
+    def laporan_event_stream():
+        # Server-sent events: 'insert' untuk laporan baru, 'update' saat status_proses berubah.
+        # ?since_id= / header Last-Event-ID -> laporan yang terlewat dikirim dulu.
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        if events is None:
+            return jsonify({"error": "Stream laporan tidak aktif (set LAPORAN_SSE=1)"}), 503
+        q = events.subscribe()
+        if q is None:
+            return jsonify({"error": "Terlalu banyak dashboard terhubung"}), 503
+
+        backlog = []
+        since_id = parse_int(request.headers.get("Last-Event-ID") or request.args.get("since_id"))
+        if since_id is not None:
+            try:
+                with engine.connect() as conn:
+                    backlog, _, _ = laporan_events.fetch_changes(conn, events.fields, since_id, limit=MAX_LIMIT)
+            except Exception:
+                events.unsubscribe(q)
+                raise
+
+        resp = Response(events.stream(q, backlog), mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-store"
+        resp.headers["X-Accel-Buffering"] = "no"
+        resp.call_on_close(lambda: events.unsubscribe(q))
+        return resp
+
+    @bp.get("/laporan/export")
+    def laporan_export():
+        # Ekspor CSV/XLSX streaming: ?type=csv|xlsx + filter yang sama dengan /laporan
+        # (parameter `format` sudah dipakai filter jenis acara, jadi jenis file lewat `type`)
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        kind = (request.args.get("type") or "csv").strip().lower()
+        if kind not in ("csv", "xlsx"):
+            return jsonify({"error": "type harus csv atau xlsx"}), 400
+        try:
+            where_sql, params = _filter_from_args(request.args)
+        except ValueError:
+            return jsonify({"error": "Format tanggal harus YYYY-MM-DD"}), 400
+        fields = parse_fields(request.args.get("fields"))
+
+        rows = iter_rows(engine, fields, where_sql, params)
+        name = f"laporan_{request.args.get('dari') or 'awal'}_{request.args.get('sampai') or 'akhir'}"
+        if kind == "xlsx":
+            resp = Response(stream_xlsx(rows, fields),
+                            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        else:
+            resp = Response(stream_csv(rows, fields), mimetype="text/csv; charset=utf-8")
+        resp.headers["Content-Disposition"] = f'attachment; filename="{name}.{kind}"'
+        resp.headers["X-Accel-Buffering"] = "no"
+        return resp
+
+    @bp.get("/rollup")
+    def rollup():
+        # Tren dari tabel agregat: ?dimensi=semua|kesimpulan|td|waktu|slot&periode=hari|bulan&dari&sampai
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        try:
+            dari = _parse_date(request.args.get("dari"))
+            sampai = _parse_date(request.args.get("sampai"))
+        except ValueError:
+            return jsonify({"error": "Format tanggal harus YYYY-MM-DD"}), 400
+        dimensi = (request.args.get("dimensi") or "semua").strip().lower()
+        periode = (request.args.get("periode") or "hari").strip().lower()
+        try:
+            with engine.connect() as conn:
+                items = laporan_rollup.query(conn, dimensi, periode, dari, sampai)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"dimensi": dimensi, "periode": periode, "items": items})
+
+    @bp.get("/pool")
+    def pool_status():
+        # Statistik connection pool untuk worker yang melayani request ini
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify(pool_stats(engine))
+
+    @bp.post("/cache/invalidate")
+    def cache_invalidate():
+        # Panggil setelah mengubah tabel petugas2 / acara: ?scope=petugas|acara (kosong = semua)
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        if ref_cache is None:
+            return jsonify({"error": "Cache tidak tersedia"}), 404
+        scope = (request.args.get("scope") or "").strip().lower() or None
+        if scope not in (None, "petugas", "acara"):
+            return jsonify({"error": "scope harus petugas atau acara"}), 400
+        ref_cache.invalidate(scope)
+        return jsonify({"status": "ok", "scope": scope or "all", **ref_cache.stats()})
+
+    @bp.get("/laporan/pdf")
+    def laporan_pdf_bulk():
+        # Ekspor PDF massal: ?dari=YYYY-MM-DD&sampai=YYYY-MM-DD&waktu=pagi|sore&format=zip|pdf
+        if session.get("role") != "admin":
+            return jsonify({"error": "Unauthorized"}), 403
+        if bulk_pdf is None:
+            return jsonify({"error": "Ekspor PDF tidak tersedia"}), 404
+        try:
+            dari = _parse_date(request.args.get("dari"))
+            sampai = _parse_date(request.args.get("sampai"))
+        except ValueError:
+            return jsonify({"error": "Format tanggal harus YYYY-MM-DD"}), 400
+        waktu = (request.args.get("waktu") or "").strip().lower()
+        fmt = (request.args.get("format") or "zip").strip().lower()
+        name = f"laporan_{dari or 'awal'}_{sampai or 'akhir'}{'_' + waktu if waktu in ('pagi', 'sore') else ''}"
 
-        data = []
-        for r in rows:
-            d = dict(r._mapping)
-            d["tanggal"] = fmt_wib(d.get("tanggal"))
-            d["timestamp_wib"] = fmt_wib(d.get("timestamp_wib"))
-            data.append(d)
+        if fmt == "pdf":
+            try:
+                data = bulk_pdf.merged_pdf(dari, sampai, waktu)
+            except (ValueError, RuntimeError) as e:
+                return jsonify({"error": str(e)}), 400
+            resp = Response(data, mimetype="application/pdf")
+            resp.headers["Content-Disposition"] = f'attachment; filename="{name}.pdf"'
+            return resp
 
-        return jsonify({"items": data, "limit": limit, "offset": offset})
+        resp = Response(bulk_pdf.stream_zip(dari, sampai, waktu), mimetype="application/zip")
+        resp.headers["Content-Disposition"] = f'attachment; filename="{name}.zip"'
+        resp.headers["X-Accel-Buffering"] = "no"
+        return resp
 
     return bp
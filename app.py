@@ -1,32 +1,51 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, make_response
-import os, io, json, base64, pickle
-import gspread
-from datetime import datetime, date, timezone, timedelta
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from dotenv import load_dotenv
-from PIL import Image
-from google.oauth2.service_account import Credentials
-from oauth2client.service_account import ServiceAccountCredentials
-from werkzeug.security import check_password_hash
-from werkzeug.utils import secure_filename
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+import time
+_T_IMPORT0 = time.perf_counter()
+import startup
+from startup import Lazy, record as record_startup, report as startup_report
+# biaya import per kelompok dicatat terpisah (flask --app app startup-report)
+with startup.timed("flask/werkzeug", kind="import"):
+    from flask import Flask, Response, render_template, request, jsonify, send_file, session, redirect, url_for, make_response
+    import click
+    from dotenv import load_dotenv
+    from werkzeug.security import check_password_hash
+    from werkzeug.utils import secure_filename
+    from werkzeug.datastructures import FileStorage
+    from werkzeug.middleware.proxy_fix import ProxyFix
+import os, io, json, base64, pickle, shutil, tempfile
+from concurrent.futures import TimeoutError as FuturesTimeout
+from datetime import datetime, date, timezone
+with startup.timed("sqlalchemy", kind="import"):
+    from sqlalchemy import text
+    from sqlalchemy.orm import sessionmaker
+    from db_pool import create_pooled_engine
+with startup.timed("image_pipeline (Pillow)", kind="import"):
+    from image_pipeline import ImageProfile, compress_image
+with startup.timed("modul aplikasi", kind="import"):
+    import acara_store
+    import laporan_rollup
+    import laporan_search
+    import metrics
+    import upload_dedup
+    from jobs import JobQueue
+    from chunked_upload import UploadError, UploadStore
+    from sheets_outbox import FakeWorksheet, SheetsOutbox
+    from pdf_cache import PdfCache
+    from pdf_render_pool import RenderBusy, RenderPool
+    from ref_cache import RefCache
+    import image_variants
+    import json_stream
+    import laporan_repo
+    from laporan_repo import PageStream, estimate_count, fetch_page, parse_fields, parse_int, parse_limit
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
-from sqlalchemy.pool import NullPool
-import pathlib
 import re
-from reportlab.platypus import Image as RLImage  # untuk logo di PDF
-from reportlab.lib.units import mm
 
 
 
 # --- Cloudinary ---
-import cloudinary
-import cloudinary.uploader as cldu
-from cloudinary.utils import cloudinary_url
+with startup.timed("cloudinary", kind="import"):
+    import cloudinary
+    import cloudinary.uploader as cldu
+    from cloudinary.utils import cloudinary_url
 
 # -------------------------------------------------------
 # Init
@@ -35,10 +54,24 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "rahasia-super")
 app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024  # limit upload 10MB
+# Di belakang router platform / reverse proxy: request.remote_addr diambil dari X-Forwarded-For
+# (kuota /api/uploads dihitung per klien). PROXY_FIX_HOPS = jumlah proxy tepercaya; 0 bila
+# gunicorn langsung menerima koneksi klien (header dari klien tidak boleh dipercaya).
+PROXY_FIX_HOPS = int(os.getenv("PROXY_FIX_HOPS", "1"))
+if PROXY_FIX_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_HOPS)
+# histogram latensi per route (METRICS_ENABLED=1); didaftarkan paling awal agar ikut mengukur auth
+metrics.init_app(app)
 
 PDF_DIR = os.path.join(app.root_path, "generated_pdfs")
 os.makedirs(PDF_DIR, exist_ok=True)
+# File bukti mentah ditampung di sini sampai worker selesai upload ke Cloudinary
+PENDING_DIR = os.path.join(app.root_path, "pending_uploads")
+os.makedirs(PENDING_DIR, exist_ok=True)
 # ----------------- Database via SQLAlchemy -----------------
+# "require" untuk produksi; "disable" hanya untuk Postgres lokal (mis. bench_load.py)
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
 def _ensure_sqlalchemy_url_with_ssl(url: str) -> str:
     if not url:
         return url
@@ -48,7 +81,7 @@ def _ensure_sqlalchemy_url_with_ssl(url: str) -> str:
         scheme = "postgresql+psycopg2"
     qs = {k: v[0] for k, v in parse_qs(p.query).items()}
     if qs.get("sslmode") not in ("require", "verify-ca", "verify-full"):
-        qs["sslmode"] = "require"
+        qs["sslmode"] = DB_SSLMODE
     return urlunparse(p._replace(scheme=scheme, query=urlencode(qs)))
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -56,36 +89,52 @@ if not DATABASE_URL:
     raise RuntimeError("❌ DATABASE_URL tidak ditemukan di environment variables!")
 DATABASE_URL = _ensure_sqlalchemy_url_with_ssl(DATABASE_URL)
 
-engine = create_engine(
+# Pool dikonfigurasi lewat env DB_POOL_* (lihat db_pool.py); tiap worker gunicorn punya pool sendiri
+engine = create_pooled_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=1800,
-    poolclass=NullPool,
-    connect_args={"sslmode": "require"},
+    connect_args={"sslmode": DB_SSLMODE},
 )
+metrics.instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-with engine.begin() as conn:
-    conn.execute(text("ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS timestamp_wib TIMESTAMP"))
-
-# ----------------- Google Sheets -----------------
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-if os.getenv("GOOGLE_CREDS"):
-    creds_dict = json.loads(os.getenv("GOOGLE_CREDS"))
-    sa_creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
-else:
-    sa_creds = ServiceAccountCredentials.from_json_keyfile_name("google_creds.json", scope)
-
-client = gspread.authorize(sa_creds)
-sheet = client.open_by_key("10u7E3c_IA5irWT0XaKb4eb10taOocH1Q9BK7UrlccDU").sheet1
-
-# ----------------- Cloudinary config -----------------
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
+# Skema (ALTER/CREATE) tidak lagi dijalankan saat import: flask --app app db-migrate (lihat migrations.py)
+
+# ----------------- Google Sheets (lazy) -----------------
+SHEET_KEY = os.getenv("GOOGLE_SHEET_KEY", "10u7E3c_IA5irWT0XaKb4eb10taOocH1Q9BK7UrlccDU")
+
+def _open_sheet():
+    if os.getenv("SHEETS_FAKE") == "1":
+        # uji offline tanpa Google: baris hanya disimpan di memori
+        return FakeWorksheet(latency=float(os.getenv("SHEETS_FAKE_LATENCY", "0")))
+
+    # import & auth baru terjadi saat Sheet pertama kali dipakai (batcher outbox)
+    gspread = startup.import_module("gspread")
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    if os.getenv("GOOGLE_CREDS"):
+        Credentials = startup.import_module("google.oauth2.service_account").Credentials
+        creds_dict = json.loads(os.getenv("GOOGLE_CREDS"))
+        sa_creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
+    else:
+        ServiceAccountCredentials = startup.import_module("oauth2client.service_account").ServiceAccountCredentials
+        sa_creds = ServiceAccountCredentials.from_json_keyfile_name("google_creds.json", scope)
+
+    with startup.timed("google_sheets auth+open"):
+        client = gspread.authorize(sa_creds)
+        return client.open_by_key(SHEET_KEY).sheet1
+
+get_sheet = Lazy("google_sheets", _open_sheet)
+
+# ----------------- Cloudinary config (lazy) -----------------
+def _configure_cloudinary():
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+        api_key=os.getenv("CLOUDINARY_API_KEY"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+        secure=True
+    )
+    return True
+
+ensure_cloudinary = Lazy("cloudinary", _configure_cloudinary)
 BASE_FOLDER = os.getenv("CLOUDINARY_BASE_FOLDER", "td")
 FOLDER_STUDIO = os.getenv("CLOUDINARY_FOLDER_STUDIO", f"{BASE_FOLDER}/studio")
 FOLDER_STREAMING = os.getenv("CLOUDINARY_FOLDER_STREAMING", f"{BASE_FOLDER}/streaming")
@@ -93,41 +142,54 @@ FOLDER_SUBCONTROL = os.getenv("CLOUDINARY_FOLDER_SUBCONTROL", f"{BASE_FOLDER}/su
 FOLDER_KENDALA = os.getenv("CLOUDINARY_FOLDER_KENDALA", f"{BASE_FOLDER}/kendala")
 FOLDER_PDF = os.getenv("CLOUDINARY_FOLDER_PDF", f"{BASE_FOLDER}/pdf")
 
-# ----------------- Util Waktu (WIB) -----------------
-# Fallback tanpa paket tambahan (UTC+7) jika zoneinfo tak tersedia
-from datetime import datetime, date, timezone, timedelta
-
-try:
-    # Python 3.9+ (preferred)
-    from zoneinfo import ZoneInfo
-    TZ_WIB = ZoneInfo("Asia/Makassar")
-except Exception:
-    # Fallback tanpa paket eksternal: offset tetap UTC+7
-    TZ_WIB = timezone(timedelta(hours=7))
-
-def now_wib_minute_aw() -> datetime:
-    return datetime.now(timezone.utc).astimezone(TZ_WIB).replace(second=0, microsecond=0)
-
-def to_naive_wib(dt_aw: datetime) -> datetime:
-    if dt_aw is None:
-        return None
-    if dt_aw.tzinfo is None:
-        return dt_aw.replace(second=0, microsecond=0)
-    return dt_aw.astimezone(TZ_WIB).replace(tzinfo=None, second=0, microsecond=0)
+# Profil kompres per folder bukti (bisa di-override: IMAGE_<NAMA>_MAX_EDGE, _QUALITY, _MAX_BYTES)
+DEFAULT_IMAGE_PROFILE = ImageProfile.from_env("DEFAULT", max_edge=1600, quality=75)
+IMAGE_PROFILES = {
+    FOLDER_STUDIO: ImageProfile.from_env("STUDIO", max_edge=1600, quality=75, max_bytes=400_000),
+    FOLDER_STREAMING: ImageProfile.from_env("STREAMING", max_edge=1600, quality=75, max_bytes=400_000),
+    FOLDER_SUBCONTROL: ImageProfile.from_env("SUBCONTROL", max_edge=1600, quality=75, max_bytes=400_000),
+    # foto kendala sering perlu detail (teks di monitor / panel) -> lebih besar
+    FOLDER_KENDALA: ImageProfile.from_env("KENDALA", max_edge=2048, quality=80, max_bytes=700_000),
+}
 
-def fmt_wib(x) -> str:
-    if x is None:
-        return ""
-    if isinstance(x, datetime):
-        if x.tzinfo is None:
-            return x.strftime("%Y-%m-%d %H:%M")
-        return x.astimezone(TZ_WIB).strftime("%Y-%m-%d %H:%M")
-    if isinstance(x, date):
-        return x.strftime("%Y-%m-%d")
-    return str(x)
+# pool bersama untuk kompres+upload foto; dibatasi supaya CPU & koneksi keluar tidak meledak
+upload_jobs = JobQueue("upload", max_workers=int(os.getenv("UPLOAD_WORKERS", "6")))
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "60"))  # detik per file
+
+# ----------------- Util Waktu (WIB) -----------------
+# Dipisah ke wib.py supaya bisa dipakai proses render PDF tanpa import app
+from wib import now_wib_minute_aw, to_naive_wib, fmt_wib
 # app.py (di bawah definisi engine & fmt_wib)
 from admin_api import create_admin_api
-app.register_blueprint(create_admin_api(engine, fmt_wib), url_prefix="/admin_api")
+from laporan_events import LaporanEvents
+from pdf_bulk import BulkPdfExporter
+bulk_pdf = BulkPdfExporter(
+    engine,
+    os.path.join(app.root_path, "static", "logo.png"),
+    workers=int(os.getenv("BULK_PDF_WORKERS", "2")),
+    max_merge=int(os.getenv("BULK_PDF_MERGE_MAX", "300")),
+)
+# Tabel petugas2 & acara jarang berubah (mingguan); hasil query di-cache per proses dengan TTL
+ref_cache = RefCache(
+    ttl=float(os.getenv("REF_CACHE_TTL", "300")),
+    stamp_path=os.path.join(PDF_DIR, ".ref_cache_stamp"),
+)
+# Dashboard admin menerima laporan baru lewat SSE (LISTEN/NOTIFY). Satu koneksi SSE memegang
+# satu thread worker, jadi hanya aktifkan dengan worker ber-thread (gunicorn --threads).
+# Tanpa SSE dashboard memakai delta polling /admin_api/laporan/changes.
+laporan_events = None
+if os.getenv("LAPORAN_SSE", "0") == "1":
+    laporan_events = LaporanEvents(
+        engine,
+        heartbeat=float(os.getenv("LAPORAN_SSE_HEARTBEAT", "15")),
+        max_seconds=float(os.getenv("LAPORAN_SSE_MAX_SECONDS", "300")),
+        variants=tuple(image_variants.VARIANTS),
+        max_subscribers=int(os.getenv("LAPORAN_SSE_MAX_CLIENTS", "50")),
+    )
+app.register_blueprint(
+    create_admin_api(engine, bulk_pdf=bulk_pdf, ref_cache=ref_cache, events=laporan_events),
+    url_prefix="/admin_api",
+)
 
 
 # ----------------- AUTH -----------------
@@ -190,6 +252,10 @@ def require_login():
         "download_pdf",
         "api_acara",
         "api_petugas",
+        "submit_status",
+        "upload_create",
+        "upload_status",
+        "upload_chunk",
         "login",
         "login_petugas",
     }
@@ -201,6 +267,10 @@ def require_login():
     if p in public_paths or any(p.startswith(s) for s in ("/api/petugas",)):
         return
 
+    # 3b) Scraper Prometheus dengan token (METRICS_TOKEN); tanpa token butuh sesi admin
+    if p == "/metrics" and metrics.scrape_authorized(request.headers.get("Authorization")):
+        return
+
     # 4) API privat → 401 JSON jika belum login
     if p.startswith("/api/") and "user_id" not in session:
         return jsonify({"error": "Unauthorized"}), 401
@@ -210,6 +280,16 @@ def require_login():
         return redirect(url_for("login", next=request.path))
 
 
+# ----------------- METRICS -----------------
+@app.route("/metrics")
+def metrics_endpoint():
+    if not metrics.ENABLED:
+        return jsonify({"error": "metrics nonaktif (METRICS_ENABLED=1)"}), 404
+    # /login_petugas memberi sesi tanpa password, jadi sesi saja tidak cukup
+    if session.get("role") != "admin" and not metrics.scrape_authorized(request.headers.get("Authorization")):
+        return jsonify({"error": "Forbidden"}), 403
+    return Response(metrics.render_text(), mimetype=metrics.CONTENT_TYPE)
+
 # ----------------- ADMIN -----------------
 @app.route("/admin")
 def admin_dashboard():
@@ -217,85 +297,115 @@ def admin_dashboard():
         return redirect(url_for("login", next=request.path))
     return render_template("admin.html")
 
+# ----------------- Cache data referensi (petugas2 & acara) -----------------
+# ref_cache dibuat sebelum blueprint admin (lihat atas); respons dikirim dengan ETag
+# sehingga browser cukup revalidasi (304).
+REF_CACHE_CONTROL = os.getenv("REF_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=600")
+
+def _cached_json(key, loader):
+    body, etag = ref_cache.get(key, loader)
+    resp = make_response(body)
+    resp.headers["Content-Type"] = "application/json"
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = REF_CACHE_CONTROL
+    return resp.make_conditional(request)
+
 # ----------------- API PETUGAS (Publik) -----------------
 @app.route("/api/petugas")
 def api_petugas():
-    jenis = request.args.get("jenis")
-    with engine.connect() as conn:
-        if jenis:
-            rows = conn.execute(
-                text("""
+    jenis = (request.args.get("jenis") or "").strip()
+
+    def load():
+        with engine.connect() as conn:
+            if jenis:
+                rows = conn.execute(
+                    text("""
+                        SELECT id, nama, jenis
+                        FROM petugas2
+                        WHERE upper(trim(jenis)) = upper(:j)
+                        ORDER BY nama ASC
+                    """),
+                    {"j": jenis}
+                )
+            else:
+                rows = conn.execute(text("""
                     SELECT id, nama, jenis
                     FROM petugas2
-                    WHERE upper(trim(jenis)) = upper(:j)
-                    ORDER BY nama ASC
-                """),
-                {"j": jenis}
-            )
-        else:
-            rows = conn.execute(text("""
-                SELECT id, nama, jenis
-                FROM petugas2
-                ORDER BY upper(trim(jenis)), nama ASC
-            """))
-        data = [dict(row._mapping) for row in rows]
-
-    app.logger.info("API /api/petugas -> %d rows; sample=%s", len(data), data[:3] if data else [])
-    resp = jsonify(data)
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    resp.headers["Pragma"] = "no-cache"
-    resp.headers["Expires"] = "0"
-    return resp
+                    ORDER BY upper(trim(jenis)), nama ASC
+                """))
+            data = [dict(row._mapping) for row in rows]
+        app.logger.info("API /api/petugas -> %d rows; sample=%s", len(data), data[:3] if data else [])
+        return data
+
+    return _cached_json(("petugas", jenis.upper()), load)
 # ----------------- API ACARA (Publik) -----------------
 @app.route("/api/acara")
 def api_acara():
     waktu = (request.args.get("waktu") or "").strip().lower()
-    q = """
-        SELECT id, nama, jenis, waktu
-        FROM acara
-    """
-    params = {}
-    if waktu in ("pagi", "sore"):
-        q += " WHERE lower(trim(waktu)) = :w"
-        params["w"] = waktu
-    q += " ORDER BY nama ASC"
-    with engine.connect() as conn:
-        rows = conn.execute(text(q), params).fetchall()
-    data = [dict(r._mapping) for r in rows]
-    # no-cache
-    resp = jsonify(data)
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    resp.headers["Pragma"] = "no-cache"
-    resp.headers["Expires"] = "0"
-    return resp
+    if waktu not in ("pagi", "sore"):
+        waktu = ""
+
+    def load():
+        q = """
+            SELECT id, nama, jenis, waktu
+            FROM acara
+        """
+        params = {}
+        if waktu:
+            q += " WHERE lower(trim(waktu)) = :w"
+            params["w"] = waktu
+        q += " ORDER BY nama ASC"
+        with engine.connect() as conn:
+            rows = conn.execute(text(q), params).fetchall()
+        return [dict(r._mapping) for r in rows]
+
+    return _cached_json(("acara", waktu), load)
 # ----------------- API LAPORAN (Admin only) -----------------
 @app.route("/api/laporan")
 def api_laporan():
     if session.get("role") != "admin":
         return jsonify({"error": "Unauthorized"}), 403
 
-    with engine.connect() as conn:
-        rows = conn.execute(text("SELECT * FROM laporanx ORDER BY id DESC")).fetchall()
+    # Body tetap list (kompatibel); info halaman lewat header.
+    # ?before_id=&limit=&fields=id,tanggal,... (lihat laporan_repo.py); ?stream=1 -> json_stream
+    if json_stream.wants_stream(request.args):
+        page = PageStream(
+            engine,
+            parse_fields(request.args.get("fields")),
+            before_id=parse_int(request.args.get("before_id")),
+            limit=parse_limit(request.args.get("limit")),
+            with_total=True,
+        )
+        resp = json_stream.response(json_stream.iter_array(page), request, on_close=page.close)
+        if page.next_before_id is not None:
+            resp.headers["X-Next-Before-Id"] = str(page.next_before_id)
+        resp.headers["X-Total-Estimate"] = str(page.total_estimate)
+        return resp
 
-    data = []
-    for r in rows:
-        d = dict(r._mapping)
-        d["tanggal"] = fmt_wib(d.get("tanggal"))
-        d["timestamp_wib"] = fmt_wib(d.get("timestamp_wib"))
-        data.append(d)
-    return jsonify(data)
+    with engine.connect() as conn:
+        data, next_before_id = fetch_page(
+            conn,
+            parse_fields(request.args.get("fields")),
+            before_id=parse_int(request.args.get("before_id")),
+            limit=parse_limit(request.args.get("limit")),
+        )
+        total = estimate_count(conn)
+    resp = jsonify(data)
+    if next_before_id is not None:
+        resp.headers["X-Next-Before-Id"] = str(next_before_id)
+    resp.headers["X-Total-Estimate"] = str(total)
+    return resp
 
 # ----------------- Cloudinary Upload Helpers -----------------
+@metrics.timed("cloudinary_upload_image")
 def _upload_image_to_cloudinary(file, folder: str, public_id_base: str) -> str:
     """Kompres ke JPEG dan upload ke Cloudinary. Return secure_url atau ''."""
     if not file or not getattr(file, "filename", ""):
         return ""
     try:
-        # kompres -> JPEG
-        img = Image.open(file.stream).convert("RGB")
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG", optimize=True, quality=70)
-        buf.seek(0)
+        ensure_cloudinary()
+        # draft decode + perkecil + buang metadata -> JPEG (lihat image_pipeline.py)
+        buf = compress_image(file.stream, IMAGE_PROFILES.get(folder, DEFAULT_IMAGE_PROFILE))
 
         safe_base = (public_id_base or "bukti").strip().replace("/", "-").replace(" ", "_")
         res = cldu.upload(
@@ -303,10 +413,14 @@ def _upload_image_to_cloudinary(file, folder: str, public_id_base: str) -> str:
             folder=folder,
             public_id=safe_base,
             type="upload", 
-            access_mode="public",         # Cloudinary akan menambah suffix unik bila overwrite=False
+            access_mode="public",         # public id dari hash isi: file yang sama tidak ditimpa
             resource_type="image",
             overwrite=False,
             format="jpg",
+            # thumbnail & medium untuk dashboard dibuat di latar belakang oleh Cloudinary
+            eager=image_variants.eager_transformations(),
+            eager_async=True,
+            timeout=UPLOAD_TIMEOUT,
         )
         return res.get("secure_url", "") or res.get("url", "")
     except Exception:
@@ -320,6 +434,7 @@ def _build_signed_raw_url(public_id_path: str, version: int | None = None) -> st
     Arg public_id_path adalah path penuh TANPA ekstensi, mis: 'td/pdf/laporan_65'
     Version gunakan nilai 'version' dari hasil upload agar URL tidak 404.
     """
+    ensure_cloudinary()
     # Pastikan tanpa ekstensi
     pid = public_id_path
     if pid.lower().endswith(".pdf"):
@@ -336,10 +451,12 @@ def _build_signed_raw_url(public_id_path: str, version: int | None = None) -> st
     )
     return url
 
+@metrics.timed("cloudinary_upload_pdf")
 def _upload_pdf_to_cloudinary(pdf_bytes: bytes, folder: str, public_id_base: str) -> str:
     if not pdf_bytes:
         return ""
     try:
+        ensure_cloudinary()
         buf = io.BytesIO(pdf_bytes); buf.seek(0)
         safe_base = (public_id_base or "laporan").strip().replace("/", "-").replace(" ", "_")
 
@@ -370,200 +487,372 @@ def _upload_pdf_to_cloudinary(pdf_bytes: bytes, folder: str, public_id_base: str
 
 
 # ----------------- PDF Builder (return bytes) -----------------
-def build_pdf_bytes(row_dict: dict) -> bytes:
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    def safe(s):
-        return "" if s is None else str(s)
-
-    base_style = styles["Normal"]
-    link_style = ParagraphStyle("link", parent=base_style, fontSize=9, leading=12)
-
-    def esc_html(s: str) -> str:
-        return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-
-    def linkify(url: str):
-        if not url:
-            return Paragraph("-", link_style)
-        u = url.strip()
-        display = u if len(u) <= 60 else (u[:57] + "...")
-        return Paragraph(f'<a href="{esc_html(u)}">{esc_html(display)}</a>', link_style)
-
-    # Header
-    # ---------- Header dengan Logo kiri atas ----------
-    logo_path = os.path.join(app.root_path, "static", "logo.png")
-    logo_flow = None
-    try:
-        if os.path.exists(logo_path):
-            # atur ukuran logo; sesuaikan jika perlu
-            logo_flow = RLImage(logo_path, width=18*mm, height=15*mm)  # kecil & rapi
-    except Exception:
-        logo_flow = None  # fallback tanpa logo
+# Naikkan bila tata letak build_pdf_bytes berubah -> semua PDF di cache dirender ulang
+PDF_TEMPLATE_VERSION = "1"
+PDF_FIELDS = (
+    "id", "timestamp_wib", "tanggal", "nama_td", "nama_pdu", "nama_tx",
+    "studio_link", "streaming_link", "subcontrol_link",
+    "acara_15", "format_15", "acara_16", "format_16",
+    "acara_17", "format_17", "acara_18", "format_18",
+    "kendala", "waktu_kendala", "link_kendala", "kesimpulan",
+)
+pdf_cache = PdfCache(
+    PDF_DIR,
+    PDF_TEMPLATE_VERSION,
+    PDF_FIELDS,
+    logo_path=os.path.join(app.root_path, "static", "logo.png"),
+    max_bytes=int(os.getenv("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024,
+)
 
-    from reportlab.platypus import Table, TableStyle  # sudah di-import, aman diulang
-    from reportlab.lib import colors
+# Template (style, logo, TableStyle) disiapkan sekali per proses; lihat pdf_report.py
+def _make_report_template():
+    # import reportlab ditunda sampai PDF pertama
+    ReportTemplate = startup.import_module("pdf_report", "pdf_report (reportlab)").ReportTemplate
+    return ReportTemplate(os.path.join(app.root_path, "static", "logo.png"), fmt_wib)
+
+report_template = Lazy("pdf_template", _make_report_template)
+
+# Render di proses terpisah yang sudah hangat; PDF_RENDER_WORKERS=0 -> selalu inline
+pdf_render_pool = RenderPool(
+    os.path.join(app.root_path, "static", "logo.png"),
+    inline_render=lambda row_dict: report_template().render(row_dict),
+    workers=int(os.getenv("PDF_RENDER_WORKERS", "1")),
+    max_queue=int(os.getenv("PDF_RENDER_QUEUE", "8")),
+    timeout=float(os.getenv("PDF_RENDER_TIMEOUT", "30")),
+    queue_wait=float(os.getenv("PDF_RENDER_QUEUE_WAIT", "5")),
+)
 
-    if logo_flow:
-        header_tbl = Table(
-            [[logo_flow, Paragraph("LAPORAN TEKNIS HARIAN", styles["Heading1"])]],
-            colWidths=[22*mm, 170*mm]
-        )
-        header_tbl.setStyle(TableStyle([
-            ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-            ("LEFTPADDING", (0,0), (-1,-1), 0),
-            ("RIGHTPADDING", (0,0), (-1,-1), 0),
-            ("TOPPADDING", (0,0), (-1,-1), 0),
-            ("BOTTOMPADDING", (0,0), (-1,-1), 0),
-            # tanpa border
-        ]))
-        elements.append(header_tbl)
-        elements.append(Spacer(1, 8))
-    else:
-        elements.append(Paragraph("LAPORAN TEKNIS HARIAN", styles["Heading1"]))
-        elements.append(Spacer(1, 12))
-
-
-    # Identitas
-    identitas = [
-        ["ID", safe(row_dict.get("id"))],
-        ["Timestamp (WIB)", fmt_wib(row_dict.get("timestamp_wib"))],
-        ["Tanggal", fmt_wib(row_dict.get("tanggal"))],
-        ["Petugas TD", safe(row_dict.get("nama_td"))],
-        ["Petugas PDU", safe(row_dict.get("nama_pdu"))],
-        ["Petugas Transmisi", safe(row_dict.get("nama_tx"))],
-    ]
-    t1 = Table(identitas, colWidths=[150, 300])
-    t1.setStyle(TableStyle([
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("BOX", (0,0), (-1,-1), 1, colors.black),
-        ("INNERGRID", (0,0), (-1,-1), 0.5, colors.grey)
-    ]))
-    elements.append(Paragraph("Step 1: Identitas Petugas", styles["Heading3"]))
-    elements.append(t1)
-    elements.append(Spacer(1, 12))
-
-    # Bukti
-    bukti = [
-        ["Studio",     linkify(safe(row_dict.get("studio_link")))],
-        ["Streaming",  linkify(safe(row_dict.get("streaming_link")))],
-        ["Subcontrol", linkify(safe(row_dict.get("subcontrol_link")))],
+@metrics.timed("build_pdf")
+def build_pdf_bytes(row_dict: dict, block: bool = False) -> bytes:
+    return pdf_render_pool.render(row_dict, block=block)
+
+@app.errorhandler(RenderBusy)
+def _render_busy(e):
+    resp = make_response(("Server sedang sibuk membuat PDF, coba lagi sebentar lagi", 503))
+    resp.headers["Retry-After"] = "5"
+    return resp
+
+# ----------------- Pipeline /submit (worker latar belakang) -----------------
+SUBMIT_ASYNC = os.getenv("SUBMIT_ASYNC", "1") != "0"
+# Laporan 'proses' lebih lama dari ini dianggap yatim (worker kena timeout/crash) dan diantrekan
+# ulang; harus lebih panjang dari waktu proses terlama (upload semua foto + PDF).
+SUBMIT_LEASE_SECONDS = float(os.getenv("SUBMIT_LEASE_SECONDS", "900"))
+# Laporan 'gagal' / 'sebagian' (foto belum ter-upload) diklaim ulang setelah SUBMIT_RETRY_SECONDS,
+# total paling banyak SUBMIT_MAX_ATTEMPTS kali; setelah itu file mentahnya dibuang.
+SUBMIT_MAX_ATTEMPTS = int(os.getenv("SUBMIT_MAX_ATTEMPTS", "3"))
+SUBMIT_RETRY_SECONDS = float(os.getenv("SUBMIT_RETRY_SECONDS", "300"))
+SUBMIT_CLAIM = {
+    "lease": SUBMIT_LEASE_SECONDS,
+    "max_attempts": SUBMIT_MAX_ATTEMPTS,
+    "retry_after": SUBMIT_RETRY_SECONDS,
+}
+
+def _pending_dir(laporan_id: int) -> str:
+    return os.path.join(PENDING_DIR, f"laporan_{laporan_id}")
+
+def _sheet_row(row_dict: dict) -> list:
+    """Urutan kolom Google Sheet (sama seperti sebelumnya)."""
+    return [
+        str(row_dict.get("tanggal")),
+        row_dict.get("nama_td"),
+        row_dict.get("nama_pdu"),
+        row_dict.get("nama_tx"),
+        row_dict.get("studio_link"),
+        row_dict.get("streaming_link"),
+        row_dict.get("subcontrol_link"),
+        row_dict.get("acara_15"), row_dict.get("format_15"),
+        row_dict.get("acara_16"), row_dict.get("format_16"),
+        row_dict.get("acara_17"), row_dict.get("format_17"),
+        row_dict.get("acara_18"), row_dict.get("format_18"),
+        row_dict.get("kendala"),
+        row_dict.get("waktu_kendala"),
+        row_dict.get("link_kendala"),
+        row_dict.get("kesimpulan"),
+        fmt_wib(row_dict.get("timestamp_wib")),
     ]
-    t2 = Table(bukti, colWidths=[150, 300])
-    t2.setStyle(TableStyle([
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("BOX", (0,0), (-1,-1), 1, colors.black),
-        ("INNERGRID", (0,0), (-1,-1), 0.5, colors.grey)
-    ]))
-    elements.append(Paragraph("Step 2: Bukti (tautan)", styles["Heading3"]))
-    elements.append(t2)
-    elements.append(Spacer(1, 12))
-
-    # Acara
-    # ---------- Acara ----------
-   
-        # ---------- Acara: pilih label jam dinamis (pagi/sore) & tampilkan nama saja ----------
-    import re
-    RE_ITEM = re.compile(r"^\{\s*(?P<nama>.+?)\s*,\s*(?P<waktu>pagi|sore)\s*\}$", re.IGNORECASE)
-
-    def only_names(acara_str: str) -> str:
-        """'{Nama,waktu}; {Nama2,waktu}' -> 'Nama; Nama2'"""
-        if not acara_str:
-            return ""
-        parts = [p.strip() for p in str(acara_str).split(";") if p.strip()]
-        names = []
-        for p in parts:
-            m = RE_ITEM.match(p)
-            names.append(m.group("nama") if m else p)
-        return "; ".join(names)
-
-    def detect_waktu(*acara_list: str) -> str:
-        """Hitung token 'pagi' vs 'sore' dari semua kolom acara, pilih mayoritas. Default 'sore'."""
-        pagi, sore = 0, 0
-        for s in acara_list:
-            if not s:
-                continue
-            for token in [t.strip() for t in s.split(";") if t.strip()]:
-                m = RE_ITEM.match(token)
-                if not m:
-                    continue
-                if m.group("waktu").lower() == "pagi":
-                    pagi += 1
-                else:
-                    sore += 1
-        if pagi > sore:
-            return "pagi"
-        return "sore"
 
-    a15 = safe(row_dict.get("acara_15"))
-    a16 = safe(row_dict.get("acara_16"))
-    a17 = safe(row_dict.get("acara_17"))
-    a18 = safe(row_dict.get("acara_18"))
+def _upload_file(path: str, filename: str, folder: str, digest: str) -> str:
+    """Upload satu foto, kecuali isi yang sama sudah pernah di-upload ke folder ini."""
+    with engine.connect() as conn:
+        url = upload_dedup.lookup(conn, digest, folder)
+    if url:
+        return url
+    with open(path, "rb") as fh:
+        url = _upload_image_to_cloudinary(
+            FileStorage(stream=fh, filename=filename), folder, upload_dedup.public_id_for(digest)
+        )
+    if url:
+        with engine.begin() as conn:
+            upload_dedup.remember(conn, digest, folder, url)
+    return url
 
-    waktu_siaran = detect_waktu(a15, a16, a17, a18)
+def _upload_staged_file(job_dir: str, up: dict, digest: str, started: dict) -> str:
+    # batas waktu dihitung sejak upload benar-benar mulai, bukan sejak antre di upload_jobs
+    started[digest, up["folder"]] = time.monotonic()
+    return _upload_file(os.path.join(job_dir, up["file"]), up["filename"], up["folder"], digest)
+
+def _wait_upload(fut, started: dict, key) -> str:
+    """Hasil satu upload; FuturesTimeout bila berjalan lebih dari UPLOAD_TIMEOUT."""
+    while True:
+        t0 = started.get(key)
+        if t0 is not None:
+            return fut.result(timeout=max(0.0, t0 + UPLOAD_TIMEOUT - time.monotonic())) or ""
+        try:
+            return fut.result(timeout=1.0) or ""   # masih antre: tunggu sampai mulai
+        except FuturesTimeout:
+            continue
+
+def _upload_staged_images(job_dir: str, uploads: list) -> list:
+    """Kompres + upload semua foto satu laporan secara paralel.
+    Hasil berurutan sama dengan `uploads`; file yang gagal / lewat batas waktu -> ''.
+    Foto identik (hash sama, folder sama) dalam satu laporan hanya di-upload sekali."""
+    by_content, keys, started = {}, [], {}
+    for up in uploads:
+        key = (upload_dedup.file_digest(os.path.join(job_dir, up["file"])), up["folder"])
+        if key not in by_content:
+            by_content[key] = upload_jobs.submit(_upload_staged_file, job_dir, up, key[0], started)
+        keys.append(key)
+    links = []
+    for up, key in zip(uploads, keys):
+        try:
+            links.append(_wait_upload(by_content[key], started, key))
+        except FuturesTimeout:
+            # upload yang sedang berjalan tidak bisa dibatalkan; bila akhirnya selesai, URL-nya
+            # tercatat di cloudinary_uploads dan dipakai saat laporan 'sebagian' diklaim ulang
+            app.logger.warning("Upload %s (%s) melebihi %ss", up["file"], up["field"], UPLOAD_TIMEOUT)
+            links.append("")
+        except Exception:
+            app.logger.exception("Upload %s (%s) gagal", up["file"], up["field"])
+            links.append("")
+    return links
+
+# ----------------- Upload bukti bertahap (chunked, resumable) -----------------
+# field form -> (kolom laporanx, folder Cloudinary)
+UPLOAD_FIELDS = {
+    "studio": ("studio_link", FOLDER_STUDIO),
+    "streaming": ("streaming_link", FOLDER_STREAMING),
+    "subcontrol": ("subcontrol_link", FOLDER_SUBCONTROL),
+    "kendala": ("link_kendala", FOLDER_KENDALA),
+}
+
+upload_store = UploadStore(
+    os.path.join(PENDING_DIR, "chunks"),
+    max_file_bytes=int(os.getenv("UPLOAD_MAX_FILE_MB", "25")) * 1024 * 1024,
+    # satu potongan harus muat di MAX_CONTENT_LENGTH
+    chunk_size=int(os.getenv("UPLOAD_CHUNK_KB", "2048")) * 1024,
+    ttl=float(os.getenv("UPLOAD_TTL_HOURS", "6")) * 3600,
+    max_open_per_client=int(os.getenv("UPLOAD_MAX_OPEN_PER_CLIENT", "20")),
+    max_total_bytes=int(os.getenv("UPLOAD_MAX_TOTAL_MB", "2048")) * 1024 * 1024,
+)
 
-    SLOT_LABELS = {
-        "sore": { "15": "15.00 - 15.59", "16": "16.00 - 16.59", "17": "17.00 - 17.59", "18": "18.00 - 18.59" },
-        "pagi": { "15": "08.00 - 08.59", "16": "09.00 - 09.59", "17": "10.00 - 10.59", "18": "11.00 - 11.59" },
-    }
-    L = SLOT_LABELS.get(waktu_siaran, SLOT_LABELS["sore"])
+@app.errorhandler(UploadError)
+def _upload_error(e):
+    return jsonify({"error": str(e), **e.extra}), e.status
 
-    acara_rows = [
-        [L["15"], only_names(a15), safe(row_dict.get("format_15"))],
-        [L["16"], only_names(a16), safe(row_dict.get("format_16"))],
-        [L["17"], only_names(a17), safe(row_dict.get("format_17"))],
-        [L["18"], only_names(a18), safe(row_dict.get("format_18"))],
-    ]
+@app.route("/api/uploads", methods=["POST"])
+def upload_create():
+    body = request.get_json(silent=True) or {}
+    field = (body.get("field") or "").strip().lower()
+    if field not in UPLOAD_FIELDS:
+        return jsonify({"error": f"field harus salah satu dari {', '.join(UPLOAD_FIELDS)}"}), 400
+    try:
+        size = int(body.get("size") or 0)
+    except (TypeError, ValueError):
+        size = 0
+    filename = secure_filename(body.get("filename") or "") or f"{field}.jpg"
+    # endpoint publik: kuota upload terbuka dihitung per alamat klien (lihat PROXY_FIX_HOPS)
+    client = request.remote_addr or ""
+    return jsonify(upload_store.create(filename, size, field, UPLOAD_FIELDS[field][1], client)), 201
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    return jsonify(upload_store.status(upload_id))
+
+@app.route("/api/uploads/<upload_id>", methods=["PATCH"])
+def upload_chunk(upload_id):
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"error": "header Upload-Offset wajib"}), 400
+    return jsonify(upload_store.append(upload_id, offset, request.stream, request.content_length))
+
+def _process_submission(laporan_id: int):
+    """Upload bukti ke Cloudinary, tulis link ke laporanx, append Google Sheet, render PDF.
+    Return status akhir ('selesai' / 'sebagian' / 'gagal'), atau None bila sudah diproses
+    pihak lain."""
+    # klaim atomik: hanya satu worker/proses yang memproses laporan ini
+    with engine.begin() as conn:
+        attempt = laporan_repo.claim(conn, laporan_id, **SUBMIT_CLAIM)
+    if attempt is None:
+        return None
+    last_attempt = attempt >= SUBMIT_MAX_ATTEMPTS
+
+    job_dir = _pending_dir(laporan_id)
+    # folder job hilang (redeploy di FS sementara, laporan dari host lain yang tidak kembali):
+    # foto tidak bisa di-upload lagi, laporan diselesaikan dengan link yang sudah tercatat
+    files_lost = not os.path.isdir(job_dir)
+    try:
+        if files_lost:
+            missing = ["file bukti mentah tidak ditemukan di server"]
+            with engine.begin() as conn:
+                row_dict = laporan_repo.get_laporan(conn, laporan_id)
+                SheetsOutbox.enqueue(conn, laporan_id)
+        else:
+            with open(os.path.join(job_dir, "job.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+
+            uploads = manifest.get("uploads", [])
+            links = {"studio_link": "", "streaming_link": "", "subcontrol_link": ""}
+            kendala_links, missing = [], []
+            for up, link in zip(uploads, _upload_staged_images(job_dir, uploads)):
+                if not link:
+                    missing.append(f"{up['field']} ({up['filename']})")
+                if up["field"] == "link_kendala":
+                    if link:
+                        kendala_links.append(link)
+                else:
+                    links[up["field"]] = link
+
+            with engine.begin() as conn:
+                row_dict = laporan_repo.set_links(conn, laporan_id, {**links, "link_kendala": ", ".join(kendala_links)})
+                # baris Sheet dikirim batcher outbox, bukan di sini
+                SheetsOutbox.enqueue(conn, laporan_id)
+        sheets_outbox.notify()
+
+        # PDF hanya cache: data laporan sudah lengkap, jadi render yang gagal (timeout, pool
+        # rusak) tidak menggagalkan laporan — PDF dirender lagi saat pertama diunduh
+        try:
+            # thread latar belakang: boleh menunggu antrean render
+            pdf_cache.put(row_dict, build_pdf_bytes(row_dict, block=True))
+        except Exception:
+            app.logger.exception("Render PDF laporan %s gagal; dirender saat diunduh", laporan_id)
+
+        # foto yang gagal tidak dibuang diam-diam: laporan 'sebagian' (file mentah tetap di
+        # folder job) diklaim ulang oleh _resume_pending_submissions sampai percobaan habis
+        status, note = "selesai", None
+        if missing:
+            note = f"Foto gagal di-upload: {', '.join(missing)}"
+            if not files_lost and not last_attempt:
+                status = "sebagian"
+                note += "; dicoba lagi otomatis"
+            elif last_attempt:
+                note += f" (setelah {attempt} percobaan)"
+            note = note[:500]
+        with engine.begin() as conn:
+            laporan_repo.set_status(conn, laporan_id, status, note)
+        if status == "sebagian":
+            app.logger.warning("Laporan %s: %s (file di %s)", laporan_id, note, job_dir)
+        else:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        return status
+    except Exception as e:
+        app.logger.exception("Proses laporan %s gagal (percobaan %s)", laporan_id, attempt)
+        note = str(e)
+        if last_attempt:
+            note = f"{note} (setelah {attempt} percobaan)"
+            shutil.rmtree(job_dir, ignore_errors=True)
+        with engine.begin() as conn:
+            laporan_repo.set_status(conn, laporan_id, "gagal", note[:500])
+        return "gagal"
+
+def _sweep_stale_job_dirs():
+    """Hapus folder baru_* yang tertinggal (worker mati di tengah /submit sebelum folder
+    dipindah ke laporan_<id>). /submit wajar selesai dalam hitungan detik."""
+    cutoff = time.time() - SUBMIT_LEASE_SECONDS
+    for name in os.listdir(PENDING_DIR):
+        path = os.path.join(PENDING_DIR, name)
+        try:
+            if name.startswith("baru_") and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+def _resume_pending_submissions():
+    """Lanjutkan laporan yang masih 'antri' atau 'proses' basi (mis. setelah restart/crash).
+    Dipanggil saat worker mulai dan berkala dari _start_submit_jobs."""
+    _sweep_stale_job_dirs()
+    with engine.connect() as conn:
+        rows = laporan_repo.pending_ids(conn, **SUBMIT_CLAIM)
+    for laporan_id, stale in rows:
+        # tanpa folder job: mungkin milik host lain yang masih hidup, jadi tunggu sampai laporan
+        # tidak disentuh selama satu lease; setelah itu diselesaikan tanpa foto
+        if stale or os.path.isdir(_pending_dir(laporan_id)):
+            submit_jobs.submit(_process_submission, laporan_id)
+
+sheets_outbox = SheetsOutbox(
+    engine,
+    get_worksheet=get_sheet,
+    row_builder=_sheet_row,
+    batch_size=int(os.getenv("SHEETS_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("SHEETS_FLUSH_INTERVAL", "2")),
+    max_requests_per_min=int(os.getenv("SHEETS_MAX_REQ_PER_MIN", "30")),
+)
+submit_jobs = JobQueue(
+    "submit",
+    max_workers=int(os.getenv("SUBMIT_WORKERS", "4")),
+    on_start=_resume_pending_submissions,
+)
+
+_resume_state = {"pid": None, "at": 0.0}
 
-    t3 = Table([["Jam", "Acara", "Format"]] + acara_rows, colWidths=[120, 250, 100])
-    t3.setStyle(TableStyle([
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("BOX", (0,0), (-1,-1), 1, colors.black),
-        ("INNERGRID", (0,0), (-1,-1), 0.5, colors.grey),
-        ("BACKGROUND", (0,0), (-1,0), colors.lightgrey)
-    ]))
-    elements.append(Paragraph("Step 3: Acara - Acara", styles["Heading3"]))
-    elements.append(t3)
-    elements.append(Spacer(1, 12))
-
-
-    # Kendala
-    kendalas = []
-    def _split_or_empty(v):
-        if not v:
-            return []
-        return [s.strip() for s in str(v).split(",") if s is not None]
-
-    kets = _split_or_empty(row_dict.get("kendala"))
-    wkt  = _split_or_empty(row_dict.get("waktu_kendala"))
-    lks  = _split_or_empty(row_dict.get("link_kendala"))
-
-    n = max(len(kets), len(wkt), len(lks))
-    for i in range(n):
-        ket = kets[i] if i < len(kets) and kets[i] else "-"
-        wk  = wkt[i]  if i < len(wkt)  and wkt[i]  else "-"
-        lk  = lks[i]  if i < len(lks)  and lks[i]  else ""
-        kendalas.append([ket, wk, linkify(lk) if lk else Paragraph("-", link_style)])
-
-    if kendalas:
-        t4 = Table([["Keterangan", "Waktu", "Link"]] + kendalas, colWidths=[200, 100, 200])
-        t4.setStyle(TableStyle([
-            ("VALIGN", (0,0), (-1,-1), "TOP"),
-            ("BOX", (0,0), (-1,-1), 1, colors.black),
-            ("INNERGRID", (0,0), (-1,-1), 0.5, colors.grey),
-            ("BACKGROUND", (0,0), (-1,0), colors.lightgrey)
-        ]))
-        elements.append(Paragraph("Step 4: Kendala - Kendala", styles["Heading3"]))
-        elements.append(t4)
-
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"Kesimpulan: <b>{safe(row_dict.get('kesimpulan'))}</b>", styles["Heading2"]))
-
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.read()
+def _maybe_resume_pending():
+    """Sapu laporan yatim tiap setengah lease per proses (worker lain bisa mati kapan saja)."""
+    now = time.monotonic()
+    if _resume_state["pid"] == os.getpid() and now - _resume_state["at"] < SUBMIT_LEASE_SECONDS / 2:
+        return
+    if _resume_state["pid"] != os.getpid():
+        _resume_state["pid"] = os.getpid()   # sapuan pertama sudah lewat on_start
+    else:
+        submit_jobs.submit(_resume_pending_submissions)
+    _resume_state["at"] = now
+
+@app.before_request
+def _start_submit_jobs():
+    if SUBMIT_ASYNC:
+        submit_jobs.start()
+        _maybe_resume_pending()
+    sheets_outbox.start()
+    pdf_render_pool.start()
+    upload_store.cleanup()
+
+@app.cli.command("sheets-drain")
+def sheets_drain_cmd():
+    """Kirim semua antrean sheet_outbox yang jatuh tempo sekarang juga."""
+    print(f"Terkirim: {sheets_outbox.drain_all()} baris; sisa antrean: {sheets_outbox.pending_count()}")
+
+@app.cli.command("sheets-reconcile")
+@click.option("--since", default=None, help="Hanya laporan dengan tanggal >= YYYY-MM-DD")
+@click.option("--dry-run", is_flag=True, help="Tampilkan id yang hilang tanpa mengirim")
+def sheets_reconcile_cmd(since, dry_run):
+    """Cocokkan laporanx dengan isi Google Sheet dan backfill baris yang hilang."""
+    if dry_run:
+        missing = sheets_outbox.find_missing(since=since)
+        print(f"Hilang dari Sheet: {len(missing)} laporan {missing[:50]}")
+        return
+    missing = sheets_outbox.reconcile(since=since)
+    print(f"Diantrekan ulang: {len(missing)} laporan")
+    print(f"Terkirim: {sheets_outbox.drain_all()} baris")
+
+@app.route("/api/submit_status/<int:laporan_id>")
+def submit_status(laporan_id):
+    with engine.connect() as conn:
+        row = laporan_repo.get_status(conn, laporan_id)
+    if not row:
+        return jsonify({"error": "Laporan tidak ditemukan"}), 404
+
+    status = row["status_proses"] or "selesai"
+    if status == "sebagian":
+        status = "selesai"   # data & PDF sudah ada; foto yang kurang dicoba ulang di belakang
+    out = {"id": row["id"], "status": status}
+    if status == "selesai":
+        out["pdf_url"] = url_for("serve_local_pdf", filename=f"laporan_{row['id']}.pdf", _external=True)
+        if row["error_proses"]:
+            out["message"] = row["error_proses"]   # mis. sebagian foto gagal di-upload
+    elif status == "gagal":
+        out["message"] = row["error_proses"] or ""
+    resp = jsonify(out)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
 
 # ----------------- ROUTES HALAMAN -----------------
 @app.route("/")
@@ -575,18 +864,42 @@ def form_laporan():
     return render_template("index.html")
 
 # ----------------- SUBMIT FORM (Sore / laporanx) -----------------
+IDEMPOTENCY_KEY_RE = re.compile(r"^[A-Za-z0-9_.:-]{8,100}$")
+
+def _idempotency_key():
+    """Kunci dari header Idempotency-Key atau field form idempotency_key; tidak valid -> None."""
+    key = (request.headers.get("Idempotency-Key") or request.form.get("idempotency_key") or "").strip()
+    return key if IDEMPOTENCY_KEY_RE.match(key) else None
+
+def _laporan_id_for_key(key: str):
+    with engine.connect() as conn:
+        return laporan_repo.id_for_idempotency_key(conn, key)
+
+def _submit_response(laporan_id: int, message: str):
+    filename = f"laporan_{laporan_id}.pdf"
+    return jsonify({
+        "status": "success",
+        "message": message,
+        "id": laporan_id,
+        "status_url": url_for("submit_status", laporan_id=laporan_id, _external=True),
+        "pdf_url": url_for("serve_local_pdf", filename=filename, _external=True),
+    })
+
 @app.route("/submit", methods=["POST"])
 def submit():
+    job_dir = None
     try:
         import re  # dipakai untuk parse value kartu {Nama(Jenis),pagi/sore}
 
         data = request.form.to_dict(flat=False)
 
+        # Submit ulang (koneksi putus, tombol ditekan lagi) dikenali oleh ON CONFLICT di
+        # insert_submission -> hasil laporan pertama; tidak ada query tambahan di jalur normal
+        idem_key = _idempotency_key()
+
         # ===== Timestamp WIB =====
         ts_wib_aw = now_wib_minute_aw()            # aware
         ts_wib_naive = to_naive_wib(ts_wib_aw)     # naive (untuk kolom TIMESTAMP tanpa tz)
-        ts_str_for_name = ts_wib_aw.strftime("%Y-%m-%d_%H-%M")
-        ts_str_for_sheet = ts_wib_aw.strftime("%Y-%m-%d %H:%M")
 
         # ===== Tanggal (DATE) =====
         tgl_str = (data.get("tanggal_manual", [""])[0] or "").strip()
@@ -602,30 +915,73 @@ def submit():
         petugas_transmisi_list = data.get("petugas_transmisi[]", [])
         petugas_transmisi = ", ".join(petugas_transmisi_list)
 
-        # ===== Upload bukti (Cloudinary) =====
-        studio_file = request.files.get("bukti_studio")
-        streaming_file = request.files.get("bukti_streaming")
-        subcontrol_file = request.files.get("bukti_subcontrol")
-
-        studio_link = _upload_image_to_cloudinary(studio_file, FOLDER_STUDIO, f"studio_{ts_str_for_name}") if studio_file else ""
-        streaming_link = _upload_image_to_cloudinary(streaming_file, FOLDER_STREAMING, f"streaming_{ts_str_for_name}") if streaming_file else ""
-        subcontrol_link = _upload_image_to_cloudinary(subcontrol_file, FOLDER_SUBCONTROL, f"subcontrol_{ts_str_for_name}") if subcontrol_file else ""
+        # ===== Simpan file bukti mentah ke disk (upload Cloudinary dikerjakan worker) =====
+        job_dir = tempfile.mkdtemp(prefix="baru_", dir=PENDING_DIR)
+        uploads = []
+
+        # public_id Cloudinary diturunkan dari isi file saat upload (upload_dedup.public_id_for)
+        def stage(file, field, folder):
+            if not file or not getattr(file, "filename", ""):
+                return
+            name = f"{len(uploads):02d}_{field}"
+            file.save(os.path.join(job_dir, name))
+            uploads.append({
+                "field": field,
+                "file": name,
+                "filename": file.filename,
+                "folder": folder,
+            })
+
+        already_submitted = []
+
+        def stage_uploaded(upload_id, field, folder):
+            # file sudah dikirim lewat /api/uploads; cukup dipindah ke folder job
+            if already_submitted:
+                return
+            name = f"{len(uploads):02d}_{field}"
+            try:
+                meta = upload_store.claim(upload_id, os.path.join(job_dir, name))
+            except UploadError:
+                # upload sudah dipakai submit pertama yang jawabannya tidak sampai ke klien
+                existing_id = idem_key and _laporan_id_for_key(idem_key)
+                if not existing_id:
+                    raise
+                already_submitted.append(existing_id)
+                return
+            uploads.append({
+                "field": field,
+                "file": name,
+                "filename": meta["filename"],
+                "folder": folder,
+            })
+
+        for key, (field, folder) in UPLOAD_FIELDS.items():
+            if key == "kendala":
+                continue
+            file = request.files.get(f"bukti_{key}")
+            upload_id = (data.get(f"bukti_{key}_upload_id", [""])[0] or "").strip()
+            if file and getattr(file, "filename", ""):
+                stage(file, field, folder)
+            elif upload_id:
+                stage_uploaded(upload_id, field, folder)
 
         # ===== Kendala (opsional) =====
         fotos = request.files.getlist("kendala_foto[]")
-        folder_links = []
-        for i, foto in enumerate(fotos):
+        kendala_upload_ids = data.get("kendala_upload_id[]", [])
+        for i in range(max(len(fotos), len(kendala_upload_ids))):
+            foto = fotos[i] if i < len(fotos) else None
+            upload_id = (kendala_upload_ids[i] if i < len(kendala_upload_ids) else "").strip()
             if foto and getattr(foto, "filename", ""):
-                keterangan_list = data.get("kendala_keterangan[]", [])
-                waktu_list = data.get("kendala_waktu[]", [])
-                keterangan = (keterangan_list[i] if i < len(keterangan_list) else "") or "kendala"
-                waktu_input = waktu_list[i] if i < len(waktu_list) else ""
-                waktu_for_name = waktu_input.replace(":", "-") if waktu_input else ts_str_for_name
-                public_id_base = f"{keterangan}_{waktu_for_name}".replace(" ", "_")
-                link = _upload_image_to_cloudinary(foto, FOLDER_KENDALA, public_id_base)
-                if link:
-                    folder_links.append(link)
-        folder_link_str = ", ".join(folder_links)
+                stage(foto, "link_kendala", FOLDER_KENDALA)
+            elif upload_id:
+                stage_uploaded(upload_id, "link_kendala", FOLDER_KENDALA)
+
+        if already_submitted:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return _submit_response(already_submitted[0], "Laporan ini sudah diterima sebelumnya")
+
+        with open(os.path.join(job_dir, "job.json"), "w", encoding="utf-8") as f:
+            json.dump({"uploads": uploads}, f)
 
         # ===== Kesimpulan sederhana dari waktu kendala =====
         kesimpulan = "lancar"
@@ -688,32 +1044,15 @@ def submit():
         acara_18_join, format_18_join = join_acara_format(data.get("acara_18[]", []))
 
         # ===== Simpan DB =====
-        sql = text("""
-        INSERT INTO laporanx (
-            tanggal, nama_td, nama_pdu, nama_tx,
-            studio_link, streaming_link, subcontrol_link,
-            acara_15, format_15, acara_16, format_16,
-            acara_17, format_17, acara_18, format_18,
-            kendala, waktu_kendala, link_kendala, kesimpulan,
-            timestamp_wib
-        ) VALUES (
-            :tanggal, :nama_td, :nama_pdu, :nama_tx,
-            :studio_link, :streaming_link, :subcontrol_link,
-            :acara_15, :format_15, :acara_16, :format_16,
-            :acara_17, :format_17, :acara_18, :format_18,
-            :kendala, :waktu_kendala, :link_kendala, :kesimpulan,
-            :timestamp_wib
-        ) RETURNING id
-        """)
-
         values = {
             "tanggal": tanggal_date,
             "nama_td": data.get("petugas_td", [""])[0],
             "nama_pdu": data.get("petugas_pdu", [""])[0],
             "nama_tx": petugas_transmisi,
-            "studio_link": studio_link,
-            "streaming_link": streaming_link,
-            "subcontrol_link": subcontrol_link,
+            # link bukti diisi worker setelah upload selesai
+            "studio_link": "",
+            "streaming_link": "",
+            "subcontrol_link": "",
             "acara_15": acara_15_join,
             "format_15": format_15_join,
             "acara_16": acara_16_join,
@@ -724,79 +1063,98 @@ def submit():
             "format_18": format_18_join,
             "kendala": ", ".join(data.get("kendala_keterangan[]", [])),
             "waktu_kendala": ", ".join(waktu_kendala_list),
-            "link_kendala": folder_link_str,
+            "link_kendala": "",
             "kesimpulan": kesimpulan,
             "timestamp_wib": ts_wib_naive,
+            "idempotency_key": idem_key,
         }
+        values["waktu_siaran"] = acara_store.waktu_siaran_for(values)
 
+        # satu koneksi, satu round trip: laporanx + laporan_acara + rollup + search_tsv
         with engine.begin() as conn:
-            result = conn.execute(sql, values)
-            last_id = result.fetchone()[0]
-
-        # ===== Simpan ke Google Sheet =====
-        sheet_row = [
-            str(values["tanggal"]),
-            values["nama_td"],
-            values["nama_pdu"],
-            values["nama_tx"],
-            values["studio_link"],
-            values["streaming_link"],
-            values["subcontrol_link"],
-            values["acara_15"], values["format_15"],
-            values["acara_16"], values["format_16"],
-            values["acara_17"], values["format_17"],
-            values["acara_18"], values["format_18"],
-            values["kendala"],
-            values["waktu_kendala"],
-            values["link_kendala"],
-            values["kesimpulan"],
-            ts_str_for_sheet,
-        ]
-        sheet.append_row(sheet_row)
-
-        # ===== Bangun & Simpan PDF LOKAL =====
-        with engine.connect() as conn:
-            row = conn.execute(text("SELECT * FROM laporanx WHERE id=:id"), {"id": last_id}).fetchone()
-
-        pdf_bytes = build_pdf_bytes(dict(row._mapping))
-        filename = f"laporan_{last_id}.pdf"
-        save_path = os.path.join(PDF_DIR, filename)
-        with open(save_path, "wb") as f:
-            f.write(pdf_bytes)
-
-        pdf_url = url_for("serve_local_pdf", filename=filename, _external=True)
+            inserted = laporan_repo.insert_submission(conn, values)
+        if not inserted:
+            # submit kembar: yang kalah membuang file & memakai laporan pertama
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return _submit_response(_laporan_id_for_key(idem_key), "Laporan ini sudah diterima sebelumnya")
+        last_id = inserted["id"]
+        os.replace(job_dir, _pending_dir(last_id))
+        job_dir = None
+
+        # ===== Upload, Google Sheet & PDF dikerjakan worker =====
+        if SUBMIT_ASYNC:
+            submit_jobs.submit(_process_submission, last_id)
+            message = "Laporan diterima, sedang diproses..."
+        else:
+            if _process_submission(last_id) == "gagal":
+                return jsonify({"status": "error", "message": "Laporan tersimpan, tetapi proses upload/PDF gagal"})
+            message = "Laporan berhasil disimpan!"
 
-        return jsonify({
-            "status": "success",
-            "message": "Laporan berhasil disimpan!",
-            "pdf_url": pdf_url
-        })
+        return _submit_response(last_id, message)
 
     except Exception as e:
         app.logger.exception("Submit gagal")
+        # file yang sudah disimpan / di-claim dari /api/uploads tidak punya laporan: buang
+        if job_dir is not None:
+            shutil.rmtree(job_dir, ignore_errors=True)
         return jsonify({"status": "error", "message": str(e)})
 
 
+# Serah-terima ke reverse proxy: '' = gunicorn kirim file (sendfile via wsgi.file_wrapper),
+# 'nginx' = header X-Accel-Redirect ke PDF_ACCEL_PREFIX, 'sendfile' = header X-Sendfile (Apache/lighttpd)
+PDF_ACCEL = (os.getenv("PDF_ACCEL") or "").strip().lower()
+PDF_ACCEL_PREFIX = os.getenv("PDF_ACCEL_PREFIX", "/_protected_pdfs/")
+if PDF_ACCEL == "sendfile":
+    app.config["USE_X_SENDFILE"] = True
+
+def _send_cached_pdf(row_dict: dict, download_name: str):
+    """Sajikan PDF dari cache (render bila belum ada) dengan ETag + Last-Modified -> 304.
+    File di-stream dari disk (tanpa dibaca ke memori) dan mendukung Range request."""
+    path, etag = pdf_cache.get_or_build(row_dict, build_pdf_bytes)
+
+    if PDF_ACCEL == "nginx":
+        resp = make_response("")
+        resp.headers["Content-Type"] = "application/pdf"
+        resp.headers["Content-Disposition"] = f'inline; filename="{download_name}"'
+        resp.set_etag(etag)
+        resp.last_modified = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        resp = resp.make_conditional(request)
+        if resp.status_code == 200:
+            # nginx yang membaca file (sendfile + Range); worker langsung bebas
+            resp.headers["X-Accel-Redirect"] = PDF_ACCEL_PREFIX.rstrip("/") + "/" + os.path.basename(path)
+        return resp
+
+    resp = send_file(
+        path,
+        mimetype="application/pdf",
+        download_name=download_name,
+        as_attachment=False,
+        etag=etag,
+        conditional=True,
+        max_age=0,
+    )
+    # browser boleh simpan, tapi wajib revalidasi (jawaban 304 tanpa render ulang)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+LOCAL_PDF_RE = re.compile(r"^laporan_(\d+)\.pdf$")
+
 @app.route("/files/pdf/<path:filename>")
 def serve_local_pdf(filename):
     # keamanan sederhana: hanya izinkan pola nama file yang kita buat
-    if not filename.startswith("laporan_") or not filename.endswith(".pdf"):
+    m = LOCAL_PDF_RE.match(filename)
+    if not m:
         return make_response(("Not found", 404))
-    full_path = pathlib.Path(PDF_DIR) / filename
     try:
-        full_path = full_path.resolve()
-        if not str(full_path).startswith(str(pathlib.Path(PDF_DIR).resolve())):
-            return make_response(("Not found", 404))
-        if not full_path.exists():
+        with engine.connect() as conn:
+            row = laporan_repo.get_laporan(conn, int(m.group(1)))
+        # PDF baru ada setelah pipeline /submit selesai (percobaan ulang: data sudah lengkap)
+        if not row or (row.get("status_proses") in ("antri", "proses") and (row.get("percobaan") or 0) <= 1):
             return make_response(("Not found", 404))
-
-        with open(full_path, "rb") as f:
-            data = f.read()
-        resp = make_response(data)
-        resp.headers["Content-Type"] = "application/pdf"
-        resp.headers["Content-Disposition"] = f'inline; filename="{filename}"'
-        resp.headers["Cache-Control"] = "no-store"
-        return resp
+        return _send_cached_pdf(row, filename)
+    except RenderBusy:
+        raise
     except Exception:
         app.logger.exception("Gagal menyajikan PDF lokal")
         return make_response(("Gagal memuat PDF", 500))
@@ -806,10 +1164,7 @@ def serve_local_pdf(filename):
 def download_pdf(laporan_id):
     try:
         with engine.connect() as conn:
-            row = conn.execute(
-                text("SELECT * FROM laporanx WHERE id=:id"),
-                {"id": laporan_id}
-            ).fetchone()
+            row = laporan_repo.get_laporan(conn, laporan_id)
     except Exception as e:
         app.logger.exception("DB error saat ambil laporan")
         return make_response(("Database error: " + str(e), 500))
@@ -818,21 +1173,78 @@ def download_pdf(laporan_id):
         return make_response(("Laporan tidak ditemukan", 404))
 
     try:
-        pdf_bytes = build_pdf_bytes(dict(row._mapping))
-        if not pdf_bytes:
-            return make_response(("PDF kosong/invalid", 500))
-
         # Sajikan INLINE agar browser bisa render langsung (bukan download paksa)
-        resp = make_response(pdf_bytes)
-        resp.headers["Content-Type"] = "application/pdf"
-        resp.headers["Content-Disposition"] = f'inline; filename="laporan_{laporan_id}.pdf"'
-        resp.headers["Cache-Control"] = "no-store"
-        return resp
+        return _send_cached_pdf(row, f"laporan_{laporan_id}.pdf")
+    except RenderBusy:
+        raise
     except Exception as e:
         app.logger.exception("PDF build error")
         return make_response(("PDF build error: " + str(e), 500))
 
 
+@app.cli.command("db-migrate")
+def db_migrate_cmd():
+    """Jalankan migrasi skema (idempoten). Sekali per deploy, bukan per worker."""
+    from migrations import run_migrations
+    run_migrations(engine)
+    for r in startup_report():
+        if r["kind"] == "ddl":
+            print(f"  {r['component']:28s} {r['ms']:9.2f} ms")
+
+@app.cli.command("startup-report")
+@click.option("--init/--no-init", default=True, help="Ikut inisialisasi klien eksternal")
+def startup_report_cmd(init):
+    """Biaya import & inisialisasi per komponen untuk proses ini."""
+    if init:
+        for lazy in (ensure_cloudinary, report_template, get_sheet):
+            try:
+                lazy()
+            except Exception:
+                pass  # error sudah tercatat di laporan
+    # "init" Lazy sudah termasuk import yang dipicunya (baris "import" terpisah di atasnya)
+    print(f"{'komponen':28s} {'jenis':8s} {'ms':>9s}  status")
+    for r in startup_report():
+        status = "ok" if r["ok"] else f"GAGAL: {r['error']}"
+        print(f"{r['component']:28s} {r['kind']:8s} {r['ms']:9.2f}  {status}")
+
+@app.cli.command("search-backfill")
+@click.option("--batch", default=500, show_default=True)
+def search_backfill_cmd(batch):
+    """Isi laporanx.search_tsv untuk laporan lama."""
+    print(f"search_tsv diisi untuk {laporan_search.backfill(engine, batch)} laporan")
+
+@app.cli.command("rollup-rebuild")
+def rollup_rebuild_cmd():
+    """Bangun ulang laporan_rollup_harian dari seluruh laporanx."""
+    print(f"Rollup dibangun ulang dari {laporan_rollup.rebuild(engine)} laporan")
+
+@app.cli.command("acara-backfill")
+@click.option("--batch", default=500, show_default=True)
+@click.option("--restart", is_flag=True, help="Mulai dari id pertama, abaikan posisi tersimpan")
+def acara_backfill_cmd(batch, restart):
+    """Isi laporan_acara & waktu_siaran dari string acara_XX laporan lama."""
+    print(f"Diproses: {acara_store.backfill(engine, batch=batch, restart=restart)} laporan")
+
+@app.cli.command("bulk-pdf")
+@click.option("--dari", default=None, help="Tanggal awal YYYY-MM-DD (inklusif)")
+@click.option("--sampai", default=None, help="Tanggal akhir YYYY-MM-DD (inklusif)")
+@click.option("--waktu", type=click.Choice(["pagi", "sore", ""]), default="")
+@click.option("--format", "fmt", type=click.Choice(["zip", "pdf"]), default="zip")
+@click.option("--out", required=True, type=click.Path(dir_okay=False), help="File tujuan")
+def bulk_pdf_cmd(dari, sampai, waktu, fmt, out):
+    """Ekspor PDF laporan dalam rentang tanggal ke ZIP atau satu PDF gabungan."""
+    dari = date.fromisoformat(dari) if dari else None
+    sampai = date.fromisoformat(sampai) if sampai else None
+    with open(out, "wb") as f:
+        if fmt == "pdf":
+            f.write(bulk_pdf.merged_pdf(dari, sampai, waktu))
+        else:
+            for chunk in bulk_pdf.stream_zip(dari, sampai, waktu):
+                f.write(chunk)
+    print(f"Selesai: {out}")
+
+record_startup("app.py import (total)", (time.perf_counter() - _T_IMPORT0) * 1000.0, kind="import")
+
 # ----------------- RUN APP -----------------
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True)
@@ -0,0 +1,79 @@
+# bench_pdf.py — micro-benchmark render PDF laporan (tanpa database / Flask)
+#
+#   python bench_pdf.py [-n 200]
+#
+# "cold" = template disiapkan ulang setiap render (perilaku build_pdf_bytes lama:
+#          style sheet, logo, TableStyle dibuat tiap panggilan)
+# "warm" = satu ReportTemplate dipakai ulang (perilaku sekarang)
+import argparse
+import os
+import statistics
+import time
+from datetime import date, datetime
+
+from pdf_report import ReportTemplate
+from wib import fmt_wib
+
+LOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "logo.png")
+
+SAMPLE_ROW = {
+    "id": 123,
+    "timestamp_wib": datetime(2025, 9, 10, 7, 54),
+    "tanggal": date(2025, 9, 10),
+    "nama_td": "Budi",
+    "nama_pdu": "Sari",
+    "nama_tx": "Andi, Rudi",
+    "studio_link": "https://res.cloudinary.com/demo/image/upload/v1/td/studio/studio_2025-09-10_07-54.jpg",
+    "streaming_link": "https://res.cloudinary.com/demo/image/upload/v1/td/streaming/streaming_2025-09-10_07-54.jpg",
+    "subcontrol_link": "https://res.cloudinary.com/demo/image/upload/v1/td/subcontrol/subcontrol_2025-09-10_07-54.jpg",
+    "acara_15": "{Kalsel Hari Ini,sore}", "format_15": "Live",
+    "acara_16": "{Dialog Publik,sore}; {Info Banua,sore}", "format_16": "Live; Taping",
+    "acara_17": "{Jendela Kalsel,sore}", "format_17": "Taping",
+    "acara_18": "{Berita Petang,sore}", "format_18": "Live",
+    "kendala": "audio hilang, gambar freeze",
+    "waktu_kendala": "15:10, 16:42",
+    "link_kendala": "https://res.cloudinary.com/demo/a.jpg, https://res.cloudinary.com/demo/b.jpg",
+    "kesimpulan": "ada kendala saat siaran",
+}
+
+
+def _timed(fn, n: int) -> list:
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def _report(label: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:5s} n={len(samples):4d}  mean={statistics.mean(samples):7.2f} ms  "
+          f"p50={statistics.median(samples):7.2f} ms  p95={p95:7.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=200)
+    args = ap.parse_args()
+
+    def cold():
+        ReportTemplate(LOGO, fmt_wib).render(SAMPLE_ROW)
+
+    warm_tpl = ReportTemplate(LOGO, fmt_wib)
+
+    def warm():
+        warm_tpl.render(SAMPLE_ROW)
+
+    # pemanasan: import & cache font ReportLab
+    cold(); warm()
+    c = _timed(cold, args.n)
+    w = _timed(warm, args.n)
+    _report("cold", c)
+    _report("warm", w)
+    print(f"speedup (mean): {statistics.mean(c) / statistics.mean(w):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# chunked_upload.py — upload foto bukti per potong (resumable) sebelum /submit
+#
+#   POST  /api/uploads              {"filename", "size", "field"} -> {"upload_id", "offset", "chunk_size"}
+#   PATCH /api/uploads/<id>         header Upload-Offset, body = byte mentah potongan berikutnya
+#   GET   /api/uploads/<id>         -> {"offset", "size", "complete"}  (untuk resume)
+#
+# State disimpan sebagai file di satu folder (<id>.json + <id>.part / <id>.bin), jadi semua
+# worker gunicorn di host yang sama bisa melanjutkan upload yang dimulai worker lain.
+# /submit cukup mengirim upload_id dan memindahkan file lewat claim(); upload ke Cloudinary
+# baru terjadi di pipeline laporan, jadi upload yang tidak pernah di-submit tidak keluar host.
+#
+# Endpoint ini terbuka tanpa login, jadi create() membatasi jumlah upload terbuka per klien
+# (max_open_per_client) dan total byte yang dipesan di folder (max_total_bytes). Ukuran
+# dipesan penuh saat create, bukan saat potongan datang.
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """Kesalahan dari klien (id tidak dikenal, ukuran melebihi batas, dll.)."""
+
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class UploadStore:
+    def __init__(self, root: str, max_file_bytes: int = 25 * 1024 * 1024,
+                 chunk_size: int = 2 * 1024 * 1024, ttl: float = 24 * 3600,
+                 max_open_per_client: int = 20, max_total_bytes: int = 2 * 1024 ** 3):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self.max_open_per_client = max_open_per_client
+        self.max_total_bytes = max_total_bytes
+        self._last_cleanup = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- path & meta ----------
+    def _path(self, upload_id: str, ext: str) -> str:
+        if not UPLOAD_ID_RE.match(upload_id or ""):
+            raise UploadError("upload_id tidak valid", 404)
+        return os.path.join(self.root, f"{upload_id}.{ext}")
+
+    def _read_meta(self, upload_id: str) -> dict:
+        try:
+            with open(self._path(upload_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError("upload tidak ditemukan / kedaluwarsa", 404)
+
+    def _write_meta(self, upload_id: str, meta: dict):
+        path = self._path(upload_id, "json")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def _offset(self, upload_id: str, meta: dict) -> int:
+        if meta.get("complete"):
+            return meta["size"]
+        try:
+            return os.path.getsize(self._path(upload_id, "part"))
+        except FileNotFoundError:
+            return 0
+
+    def _sweep(self) -> list:
+        """Hapus upload kedaluwarsa (tidak disentuh selama ttl); return meta upload yang masih
+        terbuka. Pemanggil memegang lock folder."""
+        now = time.time()
+        groups = {}
+        for name in os.listdir(self.root):
+            upload_id, _, ext = name.partition(".")
+            if UPLOAD_ID_RE.match(upload_id):
+                groups.setdefault(upload_id, []).append(name)
+        open_uploads = []
+        for upload_id, names in groups.items():
+            paths = [os.path.join(self.root, n) for n in names]
+            try:
+                # aktivitas terakhir = potongan terakhir (.part) atau saat lengkap (.json/.bin)
+                idle = now - max(os.path.getmtime(p) for p in paths)
+            except OSError:
+                continue   # sedang di-claim / dihapus proses lain
+            if idle > self.ttl:
+                for p in paths:
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                continue
+            try:
+                open_uploads.append(self._read_meta(upload_id))
+            except (UploadError, ValueError):
+                pass
+        return open_uploads
+
+    def _locked(self):
+        f = open(os.path.join(self.root, ".lock"), "a")
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return f
+
+    # ---------- API ----------
+    def create(self, filename: str, size: int, field: str, folder: str, client: str = "") -> dict:
+        if size <= 0 or size > self.max_file_bytes:
+            raise UploadError(f"ukuran file harus 1..{self.max_file_bytes} byte", 413)
+        # hitung & pesan kuota di bawah satu lock agar worker lain tidak ikut menyalip
+        with self._locked():
+            self._last_cleanup = time.time()
+            open_uploads = self._sweep()
+            if sum(1 for m in open_uploads if m.get("client") == client) >= self.max_open_per_client:
+                raise UploadError("terlalu banyak upload terbuka; kirim laporan dulu", 429)
+            if sum(m.get("size", 0) for m in open_uploads) + size > self.max_total_bytes:
+                raise UploadError("penyimpanan upload sementara penuh; coba lagi nanti", 507)
+            upload_id = uuid.uuid4().hex
+            open(self._path(upload_id, "part"), "wb").close()
+            self._write_meta(upload_id, {
+                "filename": filename, "size": size, "field": field, "folder": folder,
+                "client": client, "created": time.time(), "complete": False,
+            })
+        return {"upload_id": upload_id, "offset": 0, "chunk_size": self.chunk_size}
+
+    def status(self, upload_id: str) -> dict:
+        meta = self._read_meta(upload_id)
+        return {
+            "upload_id": upload_id,
+            "offset": self._offset(upload_id, meta),
+            "size": meta["size"],
+            "complete": bool(meta.get("complete")),
+        }
+
+    def append(self, upload_id: str, offset: int, stream, length: int = None) -> dict:
+        """Tulis potongan mulai `offset`. Offset harus sama dengan jumlah byte yang sudah
+        diterima (409 + offset sekarang bila tidak, agar klien bisa melanjutkan)."""
+        meta = self._read_meta(upload_id)
+        if meta.get("complete"):
+            return self.status(upload_id)
+        part = self._path(upload_id, "part")
+        if not os.path.exists(part):
+            return self.status(upload_id)   # baru saja dilengkapi request lain
+        with open(part, "ab") as f:
+            # satu penulis per upload, juga antar worker gunicorn
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            f.seek(0, os.SEEK_END)
+            current = f.tell()
+            if offset != current:
+                raise UploadError("offset tidak cocok", 409, offset=current)
+            remaining = min(meta["size"] - current, self.chunk_size)
+            if length is not None and length > remaining:
+                raise UploadError("potongan melebihi ukuran file / chunk_size", 413, offset=current)
+            while remaining > 0:
+                block = stream.read(min(64 * 1024, remaining))
+                if not block:
+                    break
+                f.write(block)
+                remaining -= len(block)
+            complete = f.tell() >= meta["size"]
+            if complete:
+                os.replace(part, self._path(upload_id, "bin"))
+                meta["complete"] = True
+                self._write_meta(upload_id, meta)
+        return self.status(upload_id)
+
+    def claim(self, upload_id: str, dest: str) -> dict:
+        """Pindahkan file lengkap ke folder job /submit. Return meta (filename, folder)."""
+        meta = self._read_meta(upload_id)
+        if not meta.get("complete"):
+            raise UploadError(f"upload {upload_id} belum lengkap", 409)
+        try:
+            os.replace(self._path(upload_id, "bin"), dest)
+        except FileNotFoundError:
+            raise UploadError(f"upload {upload_id} sudah dipakai", 409)
+        os.remove(self._path(upload_id, "json"))
+        return meta
+
+    def cleanup(self, interval: float = 600):
+        """Hapus upload yang tidak pernah dipakai /submit (tidak disentuh lebih dari ttl).
+        Dipanggil berkala oleh app.py; paling sering sekali per `interval` detik per proses."""
+        now = time.time()
+        if now - self._last_cleanup < interval:
+            return
+        self._last_cleanup = now
+        with self._locked():
+            self._sweep()
@@ -0,0 +1,175 @@
+# db_pool.py — engine SQLAlchemy dengan connection pool yang bisa dikonfigurasi lewat env
+#
+# Env yang dibaca:
+#   DB_POOL_MODE      "queue" (default) atau "null" (perilaku lama: koneksi baru tiap request)
+#   DB_POOL_SIZE      jumlah koneksi tetap per worker (default 5)
+#   DB_MAX_OVERFLOW   koneksi tambahan saat ramai (default 5)
+#   DB_POOL_TIMEOUT   detik menunggu koneksi sebelum gagal (default 30)
+#   DB_POOL_RECYCLE   detik sebelum koneksi di-recycle (default 1800)
+#   DB_POOL_PRE_PING  "1"/"0" cek koneksi sebelum dipakai (default 1)
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    v = os.getenv(name)
+    if v is None:
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "on")
+
+
+class PoolStats:
+    """Counter sederhana per proses (thread-safe) untuk sizing pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.waits = 0            # checkout yang harus menunggu karena pool penuh
+        self.timeouts = 0         # checkout gagal (pool habis sampai timeout)
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def record_checkout(self, wait_ms: float, waited: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            if waited:
+                self.waits += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+            self.waits += 1
+
+    def incr(self, attr: str):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = (self.wait_total_ms / self.checkouts) if self.checkouts else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "exhausted_waits": self.waits,
+                "exhausted_timeouts": self.timeouts,
+                "wait_avg_ms": round(avg, 3),
+                "wait_max_ms": round(self.wait_max_ms, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool yang mencatat lama menunggu koneksi & kejadian pool habis."""
+
+    stats: PoolStats = None
+
+    def _do_get(self):
+        stats = self.stats
+        full = self.checkedout() >= self.size() + max(self._max_overflow, 0)
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            if stats is not None:
+                stats.record_timeout()
+            raise
+        if stats is not None:
+            stats.record_checkout((time.perf_counter() - t0) * 1000.0, full)
+        return conn
+
+    def recreate(self):
+        # dispose() membuat pool baru lewat recreate(); bawa serta objek stats-nya
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        return new_pool
+
+
+def create_pooled_engine(url: str, **kwargs):
+    """Bangun engine sesuai env DB_POOL_*. Aman untuk model pre-fork gunicorn:
+    setelah fork, child membuang koneksi warisan parent dan membuat pool sendiri."""
+    mode = (os.getenv("DB_POOL_MODE") or "queue").strip().lower()
+    stats = PoolStats()
+
+    if mode == "null":
+        engine = create_engine(
+            url,
+            poolclass=NullPool,
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            **kwargs,
+        )
+    else:
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=_env_int("DB_POOL_SIZE", 5),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 5),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            pool_use_lifo=True,
+            **kwargs,
+        )
+        engine.pool.stats = stats
+
+    engine.pool_stats = stats
+    engine.pool_mode = "null" if mode == "null" else "queue"
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, conn_record):
+        stats.incr("connects")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, conn_record):
+        stats.incr("checkins")
+
+    if mode == "null":
+        @event.listens_for(engine, "checkout")
+        def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+            stats.record_checkout(0.0, False)
+
+    def _after_fork_in_child():
+        # close=False: jangan tutup socket milik parent, cukup lupakan & buat pool baru
+        engine.dispose(close=False)
+        stats.reset()
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_after_fork_in_child)
+
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    """Ringkasan status pool untuk proses (worker) ini."""
+    pool = engine.pool
+    out = {"pid": os.getpid(), "mode": getattr(engine, "pool_mode", "unknown")}
+    if isinstance(pool, QueuePool):
+        out.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    stats = getattr(engine, "pool_stats", None)
+    if stats is not None:
+        out.update(stats.snapshot())
+    return out
@@ -0,0 +1,100 @@
+# image_pipeline.py — kompres foto bukti sebelum upload ke Cloudinary
+#
+# Foto HP (12–50 MP) tidak perlu di-decode penuh: JPEG di-decode dengan draft mode
+# (skala DCT 1/2, 1/4, 1/8), sisanya diperkecil dengan reduce() sebelum resample.
+# Orientasi EXIF diterapkan ke piksel lalu seluruh metadata dibuang.
+import io
+import math
+import os
+from dataclasses import dataclass, replace
+
+from PIL import Image, ImageOps
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    max_edge: int = 1600        # sisi terpanjang (px)
+    quality: int = 75           # kualitas JPEG awal
+    min_quality: int = 45       # batas bawah saat mengejar max_bytes
+    max_bytes: int = 0          # 0 = tanpa target ukuran
+    optimize: bool = True
+
+    @classmethod
+    def from_env(cls, name: str, **defaults) -> "ImageProfile":
+        """Baca IMAGE_<NAME>_MAX_EDGE / _QUALITY / _MIN_QUALITY / _MAX_BYTES,
+        jatuh ke IMAGE_MAX_EDGE dst., lalu ke default yang diberikan."""
+        base = cls(**defaults)
+
+        def _int(key, fallback):
+            for env in (f"IMAGE_{name}_{key}", f"IMAGE_{key}"):
+                v = os.getenv(env)
+                if v:
+                    try:
+                        return int(v)
+                    except ValueError:
+                        pass
+            return fallback
+
+        return replace(
+            base,
+            max_edge=_int("MAX_EDGE", base.max_edge),
+            quality=_int("QUALITY", base.quality),
+            min_quality=_int("MIN_QUALITY", base.min_quality),
+            max_bytes=_int("MAX_BYTES", base.max_bytes),
+        )
+
+
+def _open_downscaled(stream, max_edge: int) -> Image.Image:
+    img = Image.open(stream)
+    if img.format == "JPEG" and max_edge:
+        w, h = img.size
+        ratio = max_edge / max(w, h)
+        if ratio < 1:
+            # draft memilih skala DCT terbesar yang hasilnya masih >= ukuran ini
+            img.draft("RGB", (math.ceil(w * ratio), math.ceil(h * ratio)))
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        bg = Image.new("RGB", rgba.size, (255, 255, 255))
+        bg.paste(rgba, mask=rgba.getchannel("A"))
+        img = bg
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    if max_edge and max(img.size) > max_edge:
+        # reducing_gap: reduce() integer dulu (murah), baru resample halus
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=2.0)
+    return img
+
+
+def _encode(img: Image.Image, quality: int, optimize: bool) -> bytes:
+    buf = io.BytesIO()
+    # tanpa exif= / icc_profile= -> metadata tidak ikut tersimpan
+    img.save(buf, format="JPEG", quality=quality, optimize=optimize, progressive=True)
+    return buf.getvalue()
+
+
+def compress_image(stream, profile: ImageProfile) -> io.BytesIO:
+    """Decode + perkecil + encode JPEG sesuai profil. Return BytesIO siap upload."""
+    img = _open_downscaled(stream, profile.max_edge)
+    quality = profile.quality
+    data = _encode(img, quality, profile.optimize)
+
+    if profile.max_bytes:
+        # turunkan kualitas dulu, baru dimensi, sampai masuk anggaran byte
+        while len(data) > profile.max_bytes:
+            if quality - 10 >= profile.min_quality:
+                quality -= 10
+            elif min(img.size) > 320:
+                img = img.resize(
+                    (max(1, int(img.width * 0.85)), max(1, int(img.height * 0.85))),
+                    Image.LANCZOS,
+                )
+            else:
+                break
+            data = _encode(img, quality, profile.optimize)
+
+    buf = io.BytesIO(data)
+    buf.seek(0)
+    return buf
@@ -0,0 +1,50 @@
+# image_variants.py — URL thumbnail & medium foto bukti untuk dashboard admin
+#
+# Varian adalah URL transformasi Cloudinary yang diturunkan langsung dari URL asli
+# (…/image/upload/<transformasi>/v123/folder/id.jpg), jadi tidak perlu kolom baru atau
+# backfill: laporan lama ikut mendapat varian. Saat upload, varian yang sama diminta sebagai
+# transformasi eager (async) sehingga sudah tersedia di CDN ketika dashboard membukanya,
+# juga bila akun memakai "strict transformations".
+import os
+
+# nama -> string transformasi Cloudinary
+VARIANTS = {
+    "thumb": os.getenv("IMAGE_THUMB_TRANSFORM", "c_fill,g_auto,w_160,h_120,q_auto,f_auto"),
+    "medium": os.getenv("IMAGE_MEDIUM_TRANSFORM", "c_limit,w_800,h_800,q_auto,f_auto"),
+}
+
+LINK_COLUMNS = ("studio_link", "streaming_link", "subcontrol_link", "link_kendala")
+
+_MARKER = "/image/upload/"
+
+
+def eager_transformations() -> list:
+    """Parameter `eager` untuk cloudinary.uploader.upload."""
+    return [{"raw_transformation": t} for t in VARIANTS.values()]
+
+
+def variant_url(url: str, name: str) -> str:
+    """URL varian `name`; '' bila URL bukan gambar Cloudinary (dashboard memakai link asli)."""
+    head, sep, tail = (url or "").strip().partition(_MARKER)
+    if not sep or name not in VARIANTS:
+        return ""
+    return f"{head}{_MARKER}{VARIANTS[name]}/{tail}"
+
+
+def parse_variants(raw: str) -> tuple:
+    """'thumb,medium' -> nama varian valid (urutan VARIANTS)."""
+    wanted = {v.strip().lower() for v in (raw or "").split(",") if v.strip()}
+    return tuple(v for v in VARIANTS if v in wanted)
+
+
+def add_variants(row: dict, names=tuple(VARIANTS)) -> dict:
+    """Tambahkan <kolom>_<varian> untuk setiap kolom link yang ada di baris.
+    link_kendala berisi beberapa URL dipisah koma; varian mengikuti urutan yang sama
+    (posisi tetap ada walau kosong)."""
+    for col in LINK_COLUMNS:
+        if col not in row:
+            continue
+        urls = [u.strip() for u in str(row[col] or "").split(",") if u.strip()]
+        for name in names:
+            row[f"{col}_{name}"] = ", ".join(variant_url(u, name) for u in urls)
+    return row
@@ -0,0 +1,59 @@
+# jobs.py — antrean kerja latar belakang (thread pool) per worker gunicorn
+#
+# Dipakai /submit untuk memindahkan pekerjaan lambat (upload Cloudinary, Google Sheets,
+# render PDF) keluar dari thread request. Executor dibuat secara lazy supaya aman
+# dengan model pre-fork: thread tidak ikut ter-fork dari master.
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class JobQueue:
+    def __init__(self, name: str, max_workers: int = 4, on_start=None):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self._on_start = on_start
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._executor is not None and self._pid == pid:
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                # executor milik parent (sebelum fork) tidak punya thread di proses ini
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=self.name,
+                )
+                self._pid = pid
+                if self._on_start:
+                    self._executor.submit(self._run, self._on_start)
+        return self._executor
+
+    def start(self):
+        """Pastikan executor hidup (dan hook on_start sudah dijalankan) di proses ini."""
+        self._ensure_executor()
+
+    @staticmethod
+    def _run(fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            log.exception("Job %s gagal", getattr(fn, "__name__", fn))
+            raise
+
+    def submit(self, fn, *args, **kwargs):
+        return self._ensure_executor().submit(self._run, fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._pid = None
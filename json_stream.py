@@ -0,0 +1,79 @@
+# json_stream.py — respons JSON streaming untuk daftar laporan besar
+#
+# Baris dari server-side cursor langsung di-serialize per potong (CHUNK_ROWS) dan dikirim,
+# jadi list dict + string JSON utuh tidak pernah ada di memori sekaligus. Serializer memakai
+# orjson bila terpasang (date/datetime ditangani native), fallback ke modul json standar.
+# gzip opsional: hanya bila klien mengirim Accept-Encoding: gzip dan JSON_STREAM_GZIP=1;
+# tiap potong di-flush (Z_SYNC_FLUSH) agar browser bisa mulai menerima data segera.
+import json
+import os
+import zlib
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:   # opsional; lihat requirements.txt
+    orjson = None
+
+CHUNK_ROWS = int(os.getenv("JSON_STREAM_CHUNK_ROWS", "200"))
+GZIP_ENABLED = os.getenv("JSON_STREAM_GZIP", "1") == "1"
+GZIP_LEVEL = int(os.getenv("JSON_STREAM_GZIP_LEVEL", "5"))
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def iter_array(rows, chunk_rows: int = CHUNK_ROWS):
+    """Generator potongan byte '[{..},{..},...]' dari iterable dict."""
+    buf = [b"["]
+    n = 0
+    for row in rows:
+        buf.append(dumps(row) if n == 0 else b"," + dumps(row))
+        n += 1
+        if n % chunk_rows == 0:
+            yield b"".join(buf)
+            buf = []
+    buf.append(b"]")
+    yield b"".join(buf)
+
+
+def iter_object(head: dict, key: str, rows, tail=None, chunk_rows: int = CHUNK_ROWS):
+    """{..head, "<key>": [rows...], ..tail()} — tail dipanggil setelah semua baris terkirim,
+    untuk nilai yang baru diketahui di akhir."""
+    prefix = dumps(head)[:-1]
+    yield prefix + (b"," if len(prefix) > 1 else b"") + dumps(key) + b":"
+    yield from iter_array(rows, chunk_rows)
+    rest = dumps(tail() if tail else {})
+    yield (b"," + rest[1:]) if len(rest) > 2 else b"}"
+
+
+def _gzip(chunks):
+    z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)   # wbits 31 = format gzip
+    for chunk in chunks:
+        out = z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def wants_stream(args) -> bool:
+    return (args.get("stream") or "").strip().lower() in ("1", "true", "yes")
+
+
+def response(chunks, request, on_close=None) -> Response:
+    """Response streaming application/json; gzip bila klien mendukung."""
+    gzip = GZIP_ENABLED and "gzip" in (request.headers.get("Accept-Encoding") or "").lower()
+    resp = Response(_gzip(chunks) if gzip else chunks, mimetype="application/json")
+    if gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    # nginx: jangan tahan respons sampai selesai
+    resp.headers["X-Accel-Buffering"] = "no"
+    resp.headers["Cache-Control"] = "no-store"
+    if on_close is not None:
+        resp.call_on_close(on_close)
+    return resp
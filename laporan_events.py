@@ -0,0 +1,215 @@
+# laporan_events.py — perubahan laporanx untuk dashboard admin: delta + server-sent events
+#
+# Trigger Postgres mengirim NOTIFY laporan_berubah ('{"id": .., "op": "INSERT"|"UPDATE"}') saat
+# laporan baru masuk dan saat status_proses berubah (mis. link bukti & PDF sudah selesai),
+# serta menjaga kolom updated_at. Per worker gunicorn ada satu thread LISTEN (koneksi
+# dilepas dari pool) yang membaca baris terkait sekali lalu membagikannya ke semua
+# dashboard yang terbuka — jumlah admin tidak menambah query ke database.
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+import image_variants
+import json_stream
+from laporan_repo import LAPORAN_COLUMNS, get_many, serialize_row
+from wib import TZ_WIB
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "laporan_berubah"
+
+EVENTS_DDL = [
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS idx_laporanx_updated_at ON laporanx (updated_at)",
+    """
+    CREATE OR REPLACE FUNCTION laporanx_touch() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at := now();
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_laporanx_touch ON laporanx",
+    "CREATE TRIGGER trg_laporanx_touch BEFORE UPDATE ON laporanx FOR EACH ROW EXECUTE FUNCTION laporanx_touch()",
+    f"""
+    CREATE OR REPLACE FUNCTION laporanx_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANNEL}', json_build_object('id', NEW.id, 'op', TG_OP)::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_laporanx_notify ON laporanx",
+    "CREATE TRIGGER trg_laporanx_notify AFTER INSERT OR UPDATE OF status_proses ON laporanx"
+    " FOR EACH ROW EXECUTE FUNCTION laporanx_notify()",
+]
+
+# updated_at diisi now() = awal transaksi; transaksi yang commit belakangan bisa punya
+# updated_at sedikit lebih tua dari cursor klien, jadi delta selalu dibaca mundur sebentar.
+DELTA_OVERLAP_SECONDS = 30
+
+
+def fetch_changes(conn, fields=LAPORAN_COLUMNS, since_id: int = None, since=None, limit: int = 1000):
+    """Laporan baru (id > since_id) atau berubah (updated_at > since - overlap), urut id naik.
+    `since` = datetime aware. Return (items, truncated, cursor); cursor = {"since_id",
+    "since_timestamp_wib"} untuk panggilan berikutnya.
+    Baris bisa terkirim ulang (overlap) — klien mengganti baris dengan id yang sama."""
+    clauses, params = [], {"limit": limit + 1}
+    if since_id is not None:
+        clauses.append("id > :since_id")
+        params["since_id"] = since_id
+    if since is not None:
+        clauses.append("updated_at > CAST(:since AS timestamptz) - make_interval(secs => :overlap)")
+        params["since"] = since
+        params["overlap"] = DELTA_OVERLAP_SECONDS
+    where = ("WHERE " + " OR ".join(clauses)) if clauses else ""
+
+    now, max_id = conn.execute(text("SELECT now(), (SELECT max(id) FROM laporanx)")).one()
+    rows = conn.execute(
+        text(f"SELECT {', '.join(fields)} FROM laporanx {where} ORDER BY id LIMIT :limit"), params
+    ).fetchall()
+    truncated = len(rows) > limit
+    items = [serialize_row(dict(r._mapping)) for r in rows[:limit]]
+    cursor = {
+        "since_id": max(max_id or 0, since_id or 0),
+        "since_timestamp_wib": now.astimezone(TZ_WIB).isoformat(timespec="seconds"),
+    }
+    return items, truncated, cursor
+
+
+class LaporanEvents:
+    def __init__(self, engine, fields=LAPORAN_COLUMNS, heartbeat: float = 15.0,
+                 max_seconds: float = 300.0, max_subscribers: int = 100, queue_size: int = 100,
+                 variants=()):
+        self.engine = engine
+        self.fields = tuple(fields)
+        self.variants = tuple(variants)
+        self.heartbeat = heartbeat
+        self.max_seconds = max_seconds
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    # ---------- listener (satu per proses) ----------
+    def start(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != pid or not self._thread.is_alive():
+                if self._pid != pid:
+                    self._subscribers = set()   # antrean milik proses induk
+                self._pid = pid
+                self._thread = threading.Thread(target=self._loop, name="laporan-events", daemon=True)
+                self._thread.start()
+
+    def _connect(self):
+        raw = self.engine.raw_connection()
+        # koneksi LISTEN hidup selamanya: keluarkan dari pool supaya tidak memakan slot request
+        raw.detach()
+        dbapi = raw.driver_connection
+        dbapi.autocommit = True
+        with dbapi.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        return dbapi
+
+    def _loop(self):
+        delay = 1.0
+        while True:
+            dbapi = None
+            try:
+                dbapi = self._connect()
+                delay = 1.0
+                while True:
+                    if select.select([dbapi], [], [], self.heartbeat) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    ids = {}
+                    while dbapi.notifies:
+                        n = dbapi.notifies.pop(0)
+                        try:
+                            payload = json.loads(n.payload)
+                            ids[int(payload["id"])] = payload.get("op", "")
+                        except (ValueError, KeyError, TypeError):
+                            log.warning("Notifikasi %s tidak dikenal: %r", CHANNEL, n.payload)
+                    if ids and self._subscribers:
+                        self._publish(ids)
+            except Exception:
+                log.exception("Listener %s terputus; sambung ulang dalam %.0fs", CHANNEL, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 60.0)
+            finally:
+                if dbapi is not None:
+                    try:
+                        dbapi.close()
+                    except Exception:
+                        pass
+
+    def _publish(self, ids: dict):
+        with self.engine.connect() as conn:
+            rows = get_many(conn, ids)
+        for laporan_id in sorted(rows):
+            row = serialize_row({f: rows[laporan_id].get(f) for f in self.fields})
+            if self.variants:
+                image_variants.add_variants(row, self.variants)
+            self.broadcast(self.format_event(laporan_id, ids[laporan_id].lower(), row))
+
+    # ---------- subscriber ----------
+    def broadcast(self, message: bytes):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # dashboard yang terlalu lambat diputus; EventSource akan menyambung ulang
+                self.unsubscribe(q)
+
+    def subscribe(self):
+        """Antrean pesan SSE untuk satu dashboard; None bila slot penuh."""
+        self.start()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            q = queue.Queue(self.queue_size)
+            self._subscribers.add(q)
+            return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    @staticmethod
+    def format_event(laporan_id: int, event: str, data) -> bytes:
+        # id SSE (Last-Event-ID saat menyambung ulang) = id laporan terbaru; event update
+        # untuk laporan lama tidak boleh memundurkannya
+        head = f"id: {laporan_id}\n" if event == "insert" else ""
+        return (f"{head}event: {event}\ndata: ".encode("utf-8")
+                + json_stream.dumps(data) + b"\n\n")
+
+    def stream(self, q, backlog=()):
+        """Generator byte text/event-stream. Koneksi ditutup setelah max_seconds supaya thread
+        worker tidak tertahan selamanya; EventSource menyambung ulang dengan Last-Event-ID."""
+        try:
+            yield b"retry: 3000\n\n"
+            for item in backlog:
+                yield self.format_event(item["id"], "insert", item)
+            deadline = time.monotonic() + self.max_seconds
+            while time.monotonic() < deadline:
+                if q not in self._subscribers:
+                    return
+                try:
+                    yield q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield b": ping\n\n"
+        finally:
+            self.unsubscribe(q)
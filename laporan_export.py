@@ -0,0 +1,138 @@
+# laporan_export.py — ekspor laporanx ke CSV / XLSX secara streaming (memori konstan)
+#
+# Baris dibaca dengan server-side cursor (stream_results + yield_per) dan dikirim per
+# potong. XLSX ditulis langsung sebagai ZIP berisi SpreadsheetML minimal (tanpa
+# openpyxl), sheet di-stream baris demi baris ke ZipSink yang sama dengan ekspor PDF.
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from sqlalchemy import text
+
+from laporan_repo import LAPORAN_COLUMNS, serialize_row
+from pdf_bulk import ZipSink
+
+CHUNK_ROWS = 500
+
+# karakter kontrol yang tidak sah di XML 1.0
+_XML_ILLEGAL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="laporan" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# xf 0 = normal, xf 1 = tebal (header)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/>'
+    '</sheetView></sheetViews><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def iter_rows(engine, fields=LAPORAN_COLUMNS, where_sql: str = "", params: dict = None,
+              batch: int = CHUNK_ROWS):
+    """Yield dict per laporan (tanggal/timestamp sudah diformat fmt_wib), urut id naik."""
+    sql = f"SELECT {', '.join(fields)} FROM laporanx {where_sql} ORDER BY id"
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch).execute(
+            text(sql), params or {}
+        )
+        for r in result:
+            yield serialize_row(dict(r._mapping))
+
+
+def stream_csv(rows, fields=LAPORAN_COLUMNS):
+    """Generator potongan byte CSV (UTF-8 dengan BOM agar Excel membaca huruf dengan benar)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(fields)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(["" if row.get(f) is None else row.get(f) for f in fields])
+        if i % CHUNK_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def _cell(value, style: int = 0) -> str:
+    s = f' s="{style}"' if style else ""
+    if isinstance(value, bool) or value is None:
+        value = "" if value is None else str(value)
+    if isinstance(value, (int, float)):
+        return f"<c{s}><v>{value}</v></c>"
+    value = _XML_ILLEGAL.sub("", str(value))
+    return f'<c{s} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+
+
+def stream_xlsx(rows, fields=LAPORAN_COLUMNS):
+    """Generator potongan byte XLSX satu sheet; header tebal dan dibekukan."""
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/styles.xml", _STYLES)
+        with zf.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write(_SHEET_HEAD.encode("utf-8"))
+            sheet.write(("<row>" + "".join(_cell(f, 1) for f in fields) + "</row>").encode("utf-8"))
+            for i, row in enumerate(rows, start=1):
+                sheet.write(("<row>" + "".join(_cell(row.get(f)) for f in fields) + "</row>").encode("utf-8"))
+                if i % CHUNK_ROWS == 0:
+                    yield sink.drain()
+            sheet.write(_SHEET_TAIL.encode("utf-8"))
+    yield sink.drain()
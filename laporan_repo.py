@@ -0,0 +1,329 @@
+# laporan_repo.py — akses data tabel laporanx (dipakai app.py, admin_api.py, pdf_bulk.py)
+#
+# Statement tetap dibuat sekali di level modul (text() yang sama dipakai ulang, jadi hasil
+# kompilasi SQLAlchemy ter-cache), penulisan memakai RETURNING * supaya pemanggil tidak perlu
+# SELECT ulang, dan semua baris keluar lewat serialize_row.
+import json
+
+from sqlalchemy import text
+
+import acara_store
+import laporan_rollup
+import laporan_search
+from wib import fmt_wib
+
+# Kolom yang boleh diminta lewat ?fields= (urutan = urutan tampilan dashboard)
+LAPORAN_COLUMNS = (
+    "id", "timestamp_wib", "tanggal", "nama_td", "nama_pdu", "nama_tx",
+    "studio_link", "streaming_link", "subcontrol_link",
+    "acara_15", "format_15", "acara_16", "format_16",
+    "acara_17", "format_17", "acara_18", "format_18",
+    "kendala", "waktu_kendala", "link_kendala", "kesimpulan",
+    "waktu_siaran", "status_proses",
+)
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+
+
+def parse_fields(raw: str):
+    """'id,tanggal,nama_td' -> tuple kolom valid (id selalu ikut). Kosong -> semua kolom."""
+    if not raw:
+        return LAPORAN_COLUMNS
+    wanted = {f.strip().lower() for f in raw.split(",") if f.strip()}
+    cols = tuple(c for c in LAPORAN_COLUMNS if c in wanted)
+    return cols if "id" in cols else ("id",) + cols
+
+
+def parse_limit(raw, default: int = DEFAULT_LIMIT) -> int:
+    try:
+        return max(1, min(int(raw), MAX_LIMIT))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_int(raw):
+    try:
+        return int(raw) if raw not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def laporan_filter_sql(dari=None, sampai=None, waktu=None, acara=None, format_=None, petugas=None):
+    """WHERE + params untuk filter tanggal (inklusif), waktu siaran pagi/sore, nama acara,
+    format dan petugas. Filter acara memakai tabel laporan_acara yang ber-index (acara_store.py)."""
+    clauses, params = [], {}
+    if dari:
+        clauses.append("tanggal >= :dari")
+        params["dari"] = dari
+    if sampai:
+        clauses.append("tanggal <= :sampai")
+        params["sampai"] = sampai
+    if waktu in ("pagi", "sore"):
+        # laporan yang punya minimal satu acara pagi/sore (sama seperti filter ILIKE lama)
+        clauses.append("EXISTS (SELECT 1 FROM laporan_acara a WHERE a.laporan_id = laporanx.id AND a.waktu = :waktu)")
+        params["waktu"] = waktu
+    if acara:
+        clauses.append("EXISTS (SELECT 1 FROM laporan_acara a WHERE a.laporan_id = laporanx.id AND lower(a.nama) = lower(:acara))")
+        params["acara"] = acara
+    if format_:
+        clauses.append("EXISTS (SELECT 1 FROM laporan_acara a WHERE a.laporan_id = laporanx.id AND lower(a.format) = lower(:format))")
+        params["format"] = format_
+    if petugas:
+        # petugas = nama TD, PDU, atau salah satu nama di nama_tx ('Andi, Rudi')
+        clauses.append(
+            "(lower(nama_td) = lower(:petugas) OR lower(nama_pdu) = lower(:petugas)"
+            " OR lower(:petugas) = ANY (regexp_split_to_array(lower(nama_tx), '\\s*,\\s*')))"
+        )
+        params["petugas"] = petugas
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def serialize_row(d: dict) -> dict:
+    """Format tanggal & timestamp ke string WIB (sama seperti /api/laporan sebelumnya)."""
+    if "tanggal" in d:
+        d["tanggal"] = fmt_wib(d.get("tanggal"))
+    if "timestamp_wib" in d:
+        d["timestamp_wib"] = fmt_wib(d.get("timestamp_wib"))
+    return d
+
+
+def estimate_count(conn, where_sql: str = "", params: dict = None) -> int:
+    """Perkiraan jumlah baris dari statistik planner (tanpa COUNT(*) penuh)."""
+    if not where_sql:
+        n = conn.execute(text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = 'laporanx'::regclass"
+        )).scalar()
+        if n is not None and n >= 0:
+            return int(n)
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM laporanx {where_sql}"), params or {}).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def fetch_page(conn, fields=LAPORAN_COLUMNS, where_sql: str = "", params: dict = None,
+               before_id: int = None, limit: int = DEFAULT_LIMIT, offset: int = 0):
+    """Satu halaman laporan terbaru dulu (keyset: id < before_id).
+    Return (items, next_before_id); next_before_id None bila sudah halaman terakhir."""
+    params = dict(params or {})
+    clauses = [where_sql[len("WHERE "):]] if where_sql else []
+    if before_id is not None:
+        clauses.append("id < :before_id")
+        params["before_id"] = before_id
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    params["limit"] = limit + 1   # ambil satu lebih untuk tahu masih ada halaman berikutnya
+    sql = f"SELECT {', '.join(fields)} FROM laporanx {where} ORDER BY id DESC LIMIT :limit"
+    if offset and before_id is None:
+        # kompatibilitas lama; lebih lambat di offset besar, pakai before_id
+        sql += " OFFSET :offset"
+        params["offset"] = offset
+
+    rows = conn.execute(text(sql), params).fetchall()
+    has_more = len(rows) > limit
+    items = [serialize_row(dict(r._mapping)) for r in rows[:limit]]
+    next_before_id = items[-1]["id"] if has_more and items else None
+    return items, next_before_id
+
+
+# Format WIB dikerjakan Postgres (sama dengan fmt_wib: naive = sudah WIB), sehingga baris
+# dari cursor bisa langsung di-serialize tanpa serialize_row per baris.
+_SQL_WIB = {
+    "tanggal": "COALESCE(to_char(tanggal, 'YYYY-MM-DD'), '') AS tanggal",
+    "timestamp_wib": "COALESCE(to_char(timestamp_wib, 'YYYY-MM-DD HH24:MI'), '') AS timestamp_wib",
+}
+
+
+class PageStream:
+    """Satu halaman keyset (seperti fetch_page) yang dibaca lewat server-side cursor.
+
+    Batas halaman dicari dulu dari index id (next_before_id sudah diketahui sebelum baris
+    pertama dikirim, jadi bisa masuk header), lalu halaman dibaca sebagai rentang id
+    [next_before_id, before_id) — laporan baru yang masuk di tengah jalan tidak menggeser
+    halaman. Iterasi menghasilkan dict siap di-serialize; close() mengembalikan koneksi."""
+
+    def __init__(self, engine, fields=LAPORAN_COLUMNS, where_sql: str = "", params: dict = None,
+                 before_id: int = None, limit: int = DEFAULT_LIMIT, with_total: bool = False,
+                 batch: int = 500):
+        self.fields = tuple(fields)
+        self.conn = engine.connect()
+        try:
+            params = dict(params or {})
+            clauses = [where_sql[len("WHERE "):]] if where_sql else []
+            if before_id is not None:
+                clauses.append("id < :before_id")
+                params["before_id"] = before_id
+            where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+            self.total_estimate = estimate_count(self.conn, where_sql, params) if with_total else None
+            # id ke-limit dan ke-(limit+1): ada dua -> masih ada halaman berikutnya
+            edge = self.conn.execute(
+                text(f"SELECT id FROM laporanx {where} ORDER BY id DESC LIMIT 2 OFFSET :skip"),
+                {**params, "skip": limit - 1},
+            ).scalars().all()
+            self.next_before_id = edge[0] if len(edge) == 2 else None
+            if self.next_before_id is not None:
+                clauses.append("id >= :page_end")
+                params["page_end"] = self.next_before_id
+                where = "WHERE " + " AND ".join(clauses)
+
+            cols = ", ".join(_SQL_WIB.get(f, f) for f in self.fields)
+            self._result = self.conn.execution_options(stream_results=True, yield_per=batch).execute(
+                text(f"SELECT {cols} FROM laporanx {where} ORDER BY id DESC"), params
+            )
+        except Exception:
+            self.conn.close()
+            raise
+
+    def __iter__(self):
+        fields = self.fields
+        try:
+            for r in self._result:
+                yield dict(zip(fields, r))
+        finally:
+            self.close()
+
+    def close(self):
+        self.conn.close()
+
+
+# ---------- tulis / baca per id ----------
+INSERT_COLUMNS = (
+    "tanggal", "nama_td", "nama_pdu", "nama_tx",
+    "studio_link", "streaming_link", "subcontrol_link",
+    "acara_15", "format_15", "acara_16", "format_16",
+    "acara_17", "format_17", "acara_18", "format_18",
+    "kendala", "waktu_kendala", "link_kendala", "kesimpulan",
+    "timestamp_wib", "waktu_siaran", "idempotency_key",
+)
+
+# Satu statement = satu round trip: laporanx (+ search_tsv), laporan_acara dan
+# laporan_rollup_harian ditulis lewat CTE. Bila idempotency_key bentrok, `ins` kosong
+# sehingga acara & rollup juga tidak ditulis.
+_INSERT_SUBMISSION = text(f"""
+    WITH ins AS (
+        INSERT INTO laporanx ({", ".join(INSERT_COLUMNS)}, status_proses, search_tsv)
+        VALUES ({", ".join(":" + c for c in INSERT_COLUMNS)}, 'antri', {laporan_search.TSV_EXPR})
+        ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+        RETURNING *
+    ), acara AS (
+        INSERT INTO laporan_acara (laporan_id, slot, urutan, nama, format, waktu)
+        SELECT ins.id, a.slot, a.urutan, a.nama, a.format, a.waktu
+        FROM ins, unnest(
+            CAST(:a_slot AS smallint[]), CAST(:a_urutan AS smallint[]), CAST(:a_nama AS text[]),
+            CAST(:a_format AS text[]), CAST(:a_waktu AS text[])
+        ) AS a (slot, urutan, nama, format, waktu)
+    ), rollup_harian AS (
+        INSERT INTO laporan_rollup_harian (tanggal, dimensi, nilai, laporan, kendala)
+        SELECT CAST(:tanggal AS date), r.dimensi, r.nilai, r.laporan, r.kendala
+        FROM unnest(
+            CAST(:r_dimensi AS text[]), CAST(:r_nilai AS text[]),
+            CAST(:r_laporan AS integer[]), CAST(:r_kendala AS integer[])
+        ) AS r (dimensi, nilai, laporan, kendala)
+        WHERE EXISTS (SELECT 1 FROM ins)
+        {laporan_rollup.UPSERT_CONFLICT}
+    )
+    SELECT * FROM ins
+""")
+
+_BY_ID = text("SELECT * FROM laporanx WHERE id = :id")
+_BY_IDS = text("SELECT * FROM laporanx WHERE id = ANY(:ids)")
+_ID_BY_KEY = text("SELECT id FROM laporanx WHERE idempotency_key = :k")
+_STATUS = text("SELECT id, status_proses, error_proses FROM laporanx WHERE id = :id")
+# 'proses' yang klaimnya lebih tua dari lease = worker mati di tengah jalan (timeout/crash);
+# 'gagal' dan 'sebagian' (ada foto yang belum ter-upload) dicoba ulang setelah retry_after
+# detik, selama jumlah klaim belum mencapai max_attempts
+_CLAIMABLE = (
+    "(status_proses = 'antri'"
+    " OR (status_proses = 'proses' AND"
+    " (proses_sejak IS NULL OR proses_sejak < now() - make_interval(secs => :lease)))"
+    " OR (status_proses IN ('gagal', 'sebagian') AND percobaan < :max_attempts"
+    " AND proses_sejak < now() - make_interval(secs => :retry_after)))"
+)
+_CLAIM = text(f"""
+    UPDATE laporanx SET status_proses = 'proses', proses_sejak = now(), percobaan = percobaan + 1
+    WHERE id = :id AND {_CLAIMABLE}
+    RETURNING percobaan
+""")
+_SET_STATUS = text("UPDATE laporanx SET status_proses = :status, error_proses = :err WHERE id = :id")
+_SET_LINKS = text("""
+    UPDATE laporanx
+    SET studio_link = :studio_link, streaming_link = :streaming_link,
+        subcontrol_link = :subcontrol_link, link_kendala = :link_kendala
+    WHERE id = :id
+    RETURNING *
+""")
+_PENDING_IDS = text(f"""
+    SELECT id, updated_at < now() - make_interval(secs => :lease) AS stale
+    FROM laporanx WHERE {_CLAIMABLE} ORDER BY id
+""")
+
+
+def _submission_params(values: dict) -> dict:
+    params = {c: values.get(c) for c in INSERT_COLUMNS}
+    params.update(laporan_search.document(values))
+
+    acara = acara_store.acara_rows(None, values)
+    for col in ("slot", "urutan", "nama", "format", "waktu"):
+        params[f"a_{col}"] = [a[col] for a in acara]
+
+    contrib = laporan_rollup.contributions(values) if values.get("tanggal") else {}
+    params["r_dimensi"] = [dim for dim, _ in contrib]
+    params["r_nilai"] = [val for _, val in contrib]
+    params["r_laporan"] = [lap for lap, _ in contrib.values()]
+    params["r_kendala"] = [ken for _, ken in contrib.values()]
+    return params
+
+
+def insert_submission(conn, values: dict):
+    """INSERT laporan baru (status 'antri') beserta laporan_acara, rollup harian dan search_tsv
+    dalam satu round trip. Return dict baris baru, atau None bila idempotency_key sudah ada."""
+    row = conn.execute(_INSERT_SUBMISSION, _submission_params(values)).fetchone()
+    return dict(row._mapping) if row else None
+
+
+def get_laporan(conn, laporan_id: int):
+    row = conn.execute(_BY_ID, {"id": laporan_id}).fetchone()
+    return dict(row._mapping) if row else None
+
+
+def get_many(conn, ids) -> dict:
+    """{id: dict baris} untuk banyak id sekaligus (satu query, bukan satu per id)."""
+    ids = list(ids)
+    if not ids:
+        return {}
+    return {r.id: dict(r._mapping) for r in conn.execute(_BY_IDS, {"ids": ids})}
+
+
+def id_for_idempotency_key(conn, key: str):
+    return conn.execute(_ID_BY_KEY, {"k": key}).scalar()
+
+
+def get_status(conn, laporan_id: int):
+    row = conn.execute(_STATUS, {"id": laporan_id}).fetchone()
+    return dict(row._mapping) if row else None
+
+
+def pending_ids(conn, lease: float, max_attempts: int = 3, retry_after: float = 300.0) -> list:
+    """Laporan yang bisa diklaim: 'antri', 'proses' basi, 'gagal'/'sebagian' yang boleh diulang.
+    Return [(id, stale)]; stale = tidak diubah selama lebih dari `lease` detik."""
+    params = {"lease": lease, "max_attempts": max_attempts, "retry_after": retry_after}
+    return [(r.id, bool(r.stale)) for r in conn.execute(_PENDING_IDS, params)]
+
+
+def claim(conn, laporan_id: int, lease: float, max_attempts: int = 3, retry_after: float = 300.0):
+    """-> 'proses' secara atomik. Return nomor percobaan (1 = pertama), atau None bila sedang
+    diproses pihak lain / tidak perlu diulang."""
+    params = {"id": laporan_id, "lease": lease, "max_attempts": max_attempts, "retry_after": retry_after}
+    row = conn.execute(_CLAIM, params).fetchone()
+    return row[0] if row else None
+
+
+def set_links(conn, laporan_id: int, links: dict) -> dict:
+    """Tulis link bukti hasil upload; return dict baris lengkap (RETURNING *)."""
+    row = conn.execute(_SET_LINKS, {**links, "id": laporan_id}).fetchone()
+    return dict(row._mapping) if row else None
+
+
+def set_status(conn, laporan_id: int, status: str, error: str = None):
+    conn.execute(_SET_STATUS, {"id": laporan_id, "status": status, "err": error})
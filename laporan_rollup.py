@@ -0,0 +1,141 @@
+# laporan_rollup.py — agregat harian kesimpulan & kendala (tabel laporan_rollup_harian)
+#
+# Satu baris per (tanggal, dimensi, nilai) dengan jumlah laporan dan jumlah kendala.
+# Dimensi:
+#   semua       nilai ''                         — total per hari
+#   kesimpulan  lancar / kurang lancar / ...     — laporan per kesimpulan
+#   td          nama petugas TD
+#   waktu       pagi / sore (laporanx.waktu_siaran)
+#   slot        15..18 dari jam waktu_kendala menurut jadwal waktu_siaran (pagi 08..11,
+#               sore 15..18), 'lain' di luar jam slot
+#               (laporan = laporan yang punya kendala di slot itu)
+# Diperbarui di statement yang sama dengan INSERT laporan (laporan_repo.insert_submission) dan bisa dibangun
+# ulang penuh dengan `flask --app app rollup-rebuild`. Agregat bulanan dihitung dari tabel
+# harian ini (kecil), bukan dari laporanx.
+from collections import Counter
+
+from sqlalchemy import text
+
+from acara_store import SLOT_HOURS
+
+DIMENSIONS = ("semua", "kesimpulan", "td", "waktu", "slot")
+
+ROLLUP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS laporan_rollup_harian (
+        tanggal  DATE    NOT NULL,
+        dimensi  TEXT    NOT NULL,
+        nilai    TEXT    NOT NULL,
+        laporan  INTEGER NOT NULL DEFAULT 0,
+        kendala  INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tanggal, dimensi, nilai)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_rollup_dimensi_tanggal ON laporan_rollup_harian (dimensi, tanggal)",
+]
+
+UPSERT_CONFLICT = """
+    ON CONFLICT (tanggal, dimensi, nilai) DO UPDATE
+    SET laporan = laporan_rollup_harian.laporan + EXCLUDED.laporan,
+        kendala = laporan_rollup_harian.kendala + EXCLUDED.kendala
+"""
+
+_UPSERT = text(f"""
+    INSERT INTO laporan_rollup_harian (tanggal, dimensi, nilai, laporan, kendala)
+    VALUES (:tanggal, :dimensi, :nilai, :laporan, :kendala)
+    {UPSERT_CONFLICT}
+""")
+
+_ROW_COLUMNS = "tanggal, kesimpulan, nama_td, waktu_siaran, kendala, waktu_kendala"
+
+
+def _split(s) -> list:
+    return [p.strip() for p in str(s or "").split(",") if p.strip()]
+
+
+def _slot_of(waktu: str, waktu_siaran: str = None) -> str:
+    """Jam kendala 'HH:MM' -> slot 15..18 sesuai jadwal pagi/sore (tanpa waktu siaran: sore,
+    sama seperti label jam di PDF)."""
+    try:
+        jam = int(waktu.split(":")[0])
+    except (ValueError, IndexError):
+        return "lain"
+    hours = SLOT_HOURS.get(waktu_siaran, SLOT_HOURS["sore"])
+    return next((slot for slot, h in hours.items() if h == jam), "lain")
+
+
+def contributions(row: dict) -> dict:
+    """{(dimensi, nilai): (laporan, kendala)} untuk satu baris laporanx."""
+    waktu_list = _split(row.get("waktu_kendala"))
+    n_kendala = max(len(_split(row.get("kendala"))), len(waktu_list))
+
+    out = {}
+    for dim, val in (
+        ("semua", ""),
+        ("kesimpulan", (row.get("kesimpulan") or "").strip() or "-"),
+        ("td", (row.get("nama_td") or "").strip() or "-"),
+        ("waktu", row.get("waktu_siaran") or "-"),
+    ):
+        out[(dim, val)] = (1, n_kendala)
+
+    per_slot = Counter(_slot_of(w, row.get("waktu_siaran")) for w in waktu_list)
+    for slot, n in per_slot.items():
+        out[("slot", slot)] = (1, n)
+    return out
+
+
+def rebuild(engine, batch: int = 1000) -> int:
+    """Hitung ulang seluruh rollup dari laporanx dalam satu transaksi. Return jumlah laporan."""
+    totals = {}
+    n = 0
+    with engine.begin() as conn:
+        # submit yang sedang berjalan ditunggu; submit baru menunggu sampai rebuild commit
+        conn.execute(text("LOCK TABLE laporan_rollup_harian IN EXCLUSIVE MODE"))
+        result = conn.execution_options(stream_results=True, yield_per=batch).execute(
+            text(f"SELECT {_ROW_COLUMNS} FROM laporanx WHERE tanggal IS NOT NULL")
+        )
+        for r in result:
+            d = dict(r._mapping)
+            for key, (lap, ken) in contributions(d).items():
+                cur = totals.get((d["tanggal"],) + key, (0, 0))
+                totals[(d["tanggal"],) + key] = (cur[0] + lap, cur[1] + ken)
+            n += 1
+
+        conn.execute(text("DELETE FROM laporan_rollup_harian"))
+        rows = [
+            {"tanggal": t, "dimensi": dim, "nilai": val, "laporan": lap, "kendala": ken}
+            for (t, dim, val), (lap, ken) in totals.items()
+        ]
+        for i in range(0, len(rows), batch):
+            conn.execute(_UPSERT, rows[i:i + batch])
+    return n
+
+
+def query(conn, dimensi: str, periode: str = "hari", dari=None, sampai=None) -> list:
+    """[{periode, nilai, laporan, kendala}] urut periode lalu nilai."""
+    if dimensi not in DIMENSIONS:
+        raise ValueError(f"dimensi harus salah satu dari {', '.join(DIMENSIONS)}")
+    if periode not in ("hari", "bulan"):
+        raise ValueError("periode harus hari atau bulan")
+
+    clauses, params = ["dimensi = :dimensi"], {"dimensi": dimensi}
+    if dari:
+        clauses.append("tanggal >= :dari")
+        params["dari"] = dari
+    if sampai:
+        clauses.append("tanggal <= :sampai")
+        params["sampai"] = sampai
+    key = "tanggal" if periode == "hari" else "date_trunc('month', tanggal)::date"
+    rows = conn.execute(text(f"""
+        SELECT {key} AS periode, nilai, SUM(laporan) AS laporan, SUM(kendala) AS kendala
+        FROM laporan_rollup_harian
+        WHERE {' AND '.join(clauses)}
+        GROUP BY 1, 2
+        HAVING SUM(laporan) <> 0 OR SUM(kendala) <> 0
+        ORDER BY 1, 2
+    """), params).fetchall()
+    return [
+        {"periode": r.periode.isoformat() if periode == "hari" else r.periode.strftime("%Y-%m"),
+         "nilai": r.nilai, "laporan": int(r.laporan), "kendala": int(r.kendala)}
+        for r in rows
+    ]
@@ -0,0 +1,93 @@
+# laporan_search.py — pencarian teks penuh laporanx (kolom search_tsv + index GIN)
+#
+# Dokumen per laporan (konfigurasi 'simple': huruf kecil, tanpa stemming — cocok untuk
+# nama acara/petugas dan istilah teknis berbahasa Indonesia), dengan bobot:
+#   A  kendala + nama acara (dari acara_15..acara_18)
+#   B  nama_td, nama_pdu, nama_tx
+#   C  kesimpulan
+# search_tsv diisi langsung di INSERT /submit (TSV_EXPR, laporan_repo.insert_submission);
+# data lama: flask search-backfill.
+from sqlalchemy import text
+
+from acara_store import SLOTS, only_names
+
+TS_CONFIG = "simple"
+
+SEARCH_DDL = [
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS search_tsv tsvector",
+    "CREATE INDEX IF NOT EXISTS idx_laporanx_search_tsv ON laporanx USING GIN (search_tsv)",
+]
+
+TSV_EXPR = (
+    f"setweight(to_tsvector('{TS_CONFIG}', :doc_a), 'A') || "
+    f"setweight(to_tsvector('{TS_CONFIG}', :doc_b), 'B') || "
+    f"setweight(to_tsvector('{TS_CONFIG}', :doc_c), 'C')"
+)
+
+
+def document(row: dict) -> dict:
+    """Teks per bobot untuk satu baris laporanx."""
+    acara = " ".join(only_names(row.get(f"acara_{slot}")).replace(";", " ") for slot in SLOTS)
+    return {
+        "doc_a": f"{row.get('kendala') or ''} {acara}".strip(),
+        "doc_b": " ".join(str(row.get(c) or "") for c in ("nama_td", "nama_pdu", "nama_tx")).replace(",", " "),
+        "doc_c": row.get("kesimpulan") or "",
+    }
+
+
+def update_row(conn, laporan_id: int, row: dict):
+    """Isi search_tsv satu laporan (di transaksi pemanggil)."""
+    conn.execute(
+        text(f"UPDATE laporanx SET search_tsv = {TSV_EXPR} WHERE id = :id"),
+        {"id": laporan_id, **document(row)},
+    )
+
+
+def backfill(engine, batch: int = 500) -> int:
+    """Isi search_tsv untuk laporan lama (masih NULL)."""
+    cols = ", ".join(
+        ["id", "kendala", "nama_td", "nama_pdu", "nama_tx", "kesimpulan"] + [f"acara_{s}" for s in SLOTS]
+    )
+    done, last_id = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(f"""
+                SELECT {cols} FROM laporanx
+                WHERE search_tsv IS NULL AND id > :last_id
+                ORDER BY id
+                LIMIT :n
+            """), {"last_id": last_id, "n": batch}).fetchall()
+            if not rows:
+                return done
+            for r in rows:
+                update_row(conn, r.id, dict(r._mapping))
+            last_id = rows[-1].id
+            done += len(rows)
+
+
+def search(conn, q: str, fields, where_sql: str = "", params: dict = None,
+           limit: int = 50, offset: int = 0):
+    """Laporan yang cocok dengan `q` (sintaks websearch: "frasa", -kata, or), urut relevansi.
+    where_sql/params dari laporan_filter_sql. Return (items, next_offset)."""
+    from laporan_repo import serialize_row   # laporan_repo mengimpor modul ini (TSV_EXPR)
+
+    params = dict(params or {}, q=q, limit=limit + 1, offset=offset)
+    clauses = [where_sql[len("WHERE "):]] if where_sql else []
+    clauses.append("search_tsv @@ websearch_to_tsquery(:cfg, :q)")
+    params["cfg"] = TS_CONFIG
+    rows = conn.execute(text(f"""
+        SELECT {', '.join(fields)},
+               ts_rank_cd(search_tsv, websearch_to_tsquery(:cfg, :q)) AS rank
+        FROM laporanx
+        WHERE {' AND '.join(clauses)}
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit OFFSET :offset
+    """), params).fetchall()
+
+    has_more = len(rows) > limit
+    items = []
+    for r in rows[:limit]:
+        d = dict(r._mapping)
+        d["rank"] = round(float(d["rank"]), 4)
+        items.append(serialize_row(d))
+    return items, (offset + limit) if has_more else None
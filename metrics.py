@@ -0,0 +1,327 @@
+# metrics.py — histogram latensi per route + span hot path, format teks Prometheus
+#
+# Env yang dibaca:
+#   METRICS_ENABLED         "1" untuk menyalakan (default mati: span/decorator jadi no-op)
+#   METRICS_DIR             folder snapshot per proses (default <tmp>/laporan_metrics)
+#   METRICS_FLUSH_INTERVAL  detik antar snapshot ke disk per proses (default 5)
+#   METRICS_TOKEN           bila diisi, scraper boleh GET /metrics dengan
+#                           "Authorization: Bearer <token>"; tanpa token butuh sesi admin
+#
+# Multiprocess: tiap worker gunicorn menyimpan histogram di memori dan menulis snapshot
+# JSON ke METRICS_DIR paling sering tiap METRICS_FLUSH_INTERVAL detik. /metrics
+# menjumlahkan semua snapshot, jadi worker lain bisa tertinggal maksimal satu interval.
+# Snapshot worker yang sudah mati dilebur ke metrics_aggregate.json lalu dihapus, jadi
+# counter tidak turun dan jumlah file tidak bertambah terus setiap worker di-restart.
+import bisect
+import fcntl
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "laporan_metrics")
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# detik; upload Cloudinary/Sheets bisa belasan detik, jadi ujung atas dilebarkan
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+AGGREGATE_FILE = "metrics_aggregate.json"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True   # ada, milik user lain
+    return True
+
+
+def _merge_series(merged: dict, series: dict, names=None):
+    for name, items in series.items():
+        if names is not None and name not in names:
+            continue
+        target = merged.setdefault(name, {})
+        for labels, counts, total in items:
+            key = tuple(labels)
+            cur = target.get(key)
+            if cur is None:
+                target[key] = [list(counts), total]
+            else:
+                cur[0] = [a + b for a, b in zip(cur[0], counts)]
+                cur[1] += total
+
+
+def _read_snapshot(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Registry:
+    """Histogram per proses: name -> {labels_tuple: [counts_per_bucket..., +Inf], sum}."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._meta = {}      # name -> (help, labelnames)
+        self._series = {}    # name -> {labels: [counts(list), total(float)]}
+        self._lock = threading.Lock()
+        self._reset_process()
+
+    def _reset_process(self):
+        with self._lock:
+            for series in self._series.values():
+                series.clear()
+        self._pid = os.getpid()
+        self._path = os.path.join(METRICS_DIR, f"metrics_{self._pid}_{int(time.time() * 1000)}.json")
+        self._last_flush = 0.0
+
+    def histogram(self, name: str, help_: str, labelnames: tuple):
+        self._meta[name] = (help_, tuple(labelnames))
+        self._series.setdefault(name, {})
+
+    def observe(self, name: str, labels: tuple, seconds: float):
+        idx = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._series[name].get(labels)
+            if entry is None:
+                entry = self._series[name][labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][idx] += 1
+            entry[1] += seconds
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    # ---------- multiprocess ----------
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: [[list(labels), list(counts), total] for labels, (counts, total) in series.items()]
+                for name, series in self._series.items()
+            }
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            tmp = self._path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"buckets": self.buckets, "series": self.snapshot()}, f)
+            os.replace(tmp, self._path)
+        except OSError:
+            pass
+
+    def prune(self):
+        """Lebur snapshot proses yang sudah mati ke AGGREGATE_FILE lalu hapus filenya.
+        Nama file yang dilebur dicatat di "folded" sebelum dihapus, jadi crash di tengah
+        jalan tidak membuatnya terhitung dua kali."""
+        aggregate_path = os.path.join(METRICS_DIR, AGGREGATE_FILE)
+        try:
+            lock = open(os.path.join(METRICS_DIR, ".lock"), "a")
+        except OSError:
+            return
+        with lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            agg = _read_snapshot(aggregate_path) or {}
+            if tuple(agg.get("buckets", ())) != self.buckets:
+                agg = {"buckets": self.buckets, "series": {}, "folded": []}
+            for name in agg.get("folded", []):
+                try:
+                    os.remove(os.path.join(METRICS_DIR, name))
+                except OSError:
+                    pass
+            dead = []
+            for path in glob.glob(os.path.join(METRICS_DIR, "metrics_*_*.json")):
+                try:
+                    pid = int(os.path.basename(path).split("_")[1])
+                except ValueError:
+                    continue
+                if pid == self._pid or _pid_alive(pid):
+                    continue
+                data = _read_snapshot(path)
+                if data is not None and tuple(data.get("buckets", ())) == self.buckets:
+                    dead.append((path, data))
+                else:
+                    dead.append((path, None))   # rusak / bucket lama: tidak bisa dilebur
+            if not dead and not agg.get("folded"):
+                return
+            merged = {}
+            _merge_series(merged, agg.get("series", {}))
+            for _, data in dead:
+                if data is not None:
+                    _merge_series(merged, data.get("series", {}))
+            agg = {
+                "buckets": self.buckets,
+                "series": {
+                    name: [[list(k), c, t] for k, (c, t) in series.items()]
+                    for name, series in merged.items()
+                },
+                "folded": [os.path.basename(p) for p, _ in dead],
+            }
+            tmp = aggregate_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(agg, f)
+            os.replace(tmp, aggregate_path)
+            for path, _ in dead:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def collect(self) -> dict:
+        """Gabungkan snapshot semua proses (termasuk proses ini, di-flush dulu)."""
+        self.flush()
+        try:
+            self.prune()
+        except OSError:
+            pass
+        merged = {name: {} for name in self._meta}
+        folded = set()
+        snapshots = []
+        for path in glob.glob(os.path.join(METRICS_DIR, "metrics_*.json")):
+            data = _read_snapshot(path)
+            if data is None or tuple(data.get("buckets", ())) != self.buckets:
+                continue  # snapshot rusak / dari versi bucket lama
+            if os.path.basename(path) == AGGREGATE_FILE:
+                folded.update(data.get("folded", []))
+            snapshots.append((os.path.basename(path), data))
+        for name, data in snapshots:
+            if name not in folded:   # sudah ada di aggregate, tinggal menunggu dihapus
+                _merge_series(merged, data.get("series", {}), merged)
+        return merged
+
+    def render_text(self) -> str:
+        out = []
+        for name, series in self.collect().items():
+            help_, labelnames = self._meta[name]
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} histogram")
+            for labels, (counts, total) in sorted(series.items()):
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(labelnames, labels))
+                sep = "," if base else ""
+                cum = 0
+                for le, n in zip(self.buckets + (float("inf"),), counts):
+                    cum += n
+                    le_s = "+Inf" if le == float("inf") else repr(le)
+                    out.append(f'{name}_bucket{{{base}{sep}le="{le_s}"}} {cum}')
+                out.append(f"{name}_sum{{{base}}} {total:.6f}")
+                out.append(f"{name}_count{{{base}}} {cum}")
+        return "\n".join(out) + "\n"
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = "laporan_http_request_duration_seconds"
+SPAN_SECONDS = "laporan_span_duration_seconds"
+
+registry = Registry()
+registry.histogram(REQUEST_SECONDS, "Latensi request HTTP per route.", ("method", "route", "status"))
+registry.histogram(SPAN_SECONDS, "Durasi bagian hot path (Cloudinary, Sheets, DB, PDF).", ("span",))
+
+if hasattr(os, "register_at_fork"):
+    # worker gunicorn mulai dari nol dengan file snapshot sendiri
+    os.register_at_fork(after_in_child=registry._reset_process)
+
+
+# ---------- span ----------
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def _span(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(SPAN_SECONDS, (name,), time.perf_counter() - t0)
+
+
+def span(name: str):
+    """with span("sheets_append"): ...  — no-op bila METRICS_ENABLED mati."""
+    return _span(name) if ENABLED else _NOOP
+
+
+def timed(name: str):
+    """Decorator span; saat metrics mati fungsi dikembalikan apa adanya (tanpa overhead)."""
+    def deco(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---------- integrasi ----------
+def instrument_engine(engine, name: str = "db_connection"):
+    """Ukur lama tiap blok engine.connect()/engine.begin() (checkout -> checkin koneksi)."""
+    if not ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        conn_record.info["metrics_t0"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, conn_record):
+        t0 = conn_record.info.pop("metrics_t0", None) if conn_record is not None else None
+        if t0 is not None:
+            registry.observe(SPAN_SECONDS, (name,), time.perf_counter() - t0)
+
+
+def init_app(app):
+    """Histogram latensi per route (pakai pola rule, mis. /download_pdf/<int:laporan_id>)."""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            registry.observe(
+                REQUEST_SECONDS,
+                (request.method, rule, str(response.status_code)),
+                time.perf_counter() - t0,
+            )
+        return response
+
+
+def scrape_authorized(auth_header: str) -> bool:
+    token = os.getenv("METRICS_TOKEN")
+    if not token or not auth_header or not auth_header.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(auth_header[len("Bearer "):].strip(), token)
+
+
+def render_text() -> str:
+    return registry.render_text()
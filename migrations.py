@@ -0,0 +1,57 @@
+# migrations.py — perubahan skema database, dijalankan sekali per deploy:
+#
+#   flask --app app db-migrate
+#
+# (Procfile menjalankannya di fase release). Semua perintah idempoten (IF NOT EXISTS),
+# jadi aman diulang. Tidak lagi dijalankan saat import app.py.
+from sqlalchemy import text
+
+import acara_store
+import startup
+from laporan_events import EVENTS_DDL
+from laporan_rollup import ROLLUP_DDL
+from laporan_search import SEARCH_DDL
+from sheets_outbox import OUTBOX_DDL
+from upload_dedup import UPLOADS_DDL
+
+LAPORANX_DDL = [
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS timestamp_wib TIMESTAMP",
+    # status pipeline /submit: antri -> proses -> selesai/sebagian/gagal (NULL = data lama, dianggap selesai)
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS status_proses TEXT",
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS error_proses TEXT",
+    # kapan laporan diklaim worker; 'proses' yang lebih tua dari lease dianggap worker mati
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS proses_sejak TIMESTAMPTZ",
+    # jumlah klaim; 'gagal'/'sebagian' dicoba ulang sampai SUBMIT_MAX_ATTEMPTS
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS percobaan INTEGER NOT NULL DEFAULT 0",
+    # kunci idempoten dari form: submit ulang mengembalikan laporan yang sama
+    "ALTER TABLE laporanx ADD COLUMN IF NOT EXISTS idempotency_key TEXT",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_laporanx_idempotency_key ON laporanx (idempotency_key)"
+    " WHERE idempotency_key IS NOT NULL",
+]
+
+
+def migration_steps():
+    """[(nama, [ddl, ...]), ...] berurutan."""
+    return [
+        ("laporanx", LAPORANX_DDL),
+        # acara terstruktur + waktu_siaran (backfill data lama: flask acara-backfill)
+        ("laporan_acara", acara_store.ACARA_DDL),
+        ("sheet_outbox", OUTBOX_DDL),
+        # agregat harian; isi data lama: flask rollup-rebuild
+        ("laporan_rollup_harian", ROLLUP_DDL),
+        ("cloudinary_uploads", UPLOADS_DDL),
+        # pencarian teks penuh; isi data lama: flask search-backfill
+        ("laporanx.search_tsv", SEARCH_DDL),
+        # updated_at + NOTIFY untuk delta & SSE dashboard
+        ("laporanx.updated_at", EVENTS_DDL),
+    ]
+
+
+def run_migrations(engine, echo=print):
+    with engine.begin() as conn:
+        for name, statements in migration_steps():
+            # lama tiap langkah ikut tercatat di startup.report() (jenis "ddl")
+            with startup.timed(f"ddl {name}", kind="ddl"):
+                for ddl in statements:
+                    conn.execute(text(ddl))
+            echo(f"✔ {name}")
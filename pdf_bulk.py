@@ -0,0 +1,102 @@
+# pdf_bulk.py — ekspor PDF laporan per rentang tanggal / waktu siaran
+#
+# Baris laporanx dibaca dengan server-side cursor, dirender paralel di process pool,
+# lalu dikirim sebagai ZIP yang di-stream (memori konstan) atau satu PDF gabungan
+# dengan bookmark per laporan (butuh pypdf; jumlah laporan dibatasi).
+import io
+import multiprocessing
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import text
+
+from laporan_repo import laporan_filter_sql
+
+
+class ZipSink(io.RawIOBase):
+    """Tujuan tulis ZipFile yang tidak bisa di-seek; isinya diambil per potong."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class BulkPdfExporter:
+    def __init__(self, engine, logo_path: str, workers: int = 2, max_in_flight: int = 8,
+                 max_merge: int = 300):
+        self.engine = engine
+        self.logo_path = logo_path
+        self.workers = max(1, workers)
+        self.max_in_flight = max(self.workers, max_in_flight)
+        self.max_merge = max_merge
+
+    def count(self, dari=None, sampai=None, waktu=None) -> int:
+        where, params = laporan_filter_sql(dari, sampai, waktu)
+        with self.engine.connect() as conn:
+            return conn.execute(text(f"SELECT count(*) FROM laporanx {where}"), params).scalar() or 0
+
+    def iter_rows(self, dari=None, sampai=None, waktu=None, batch: int = 100):
+        where, params = laporan_filter_sql(dari, sampai, waktu)
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch).execute(
+                text(f"SELECT * FROM laporanx {where} ORDER BY tanggal, id"), params
+            )
+            for r in result:
+                yield dict(r._mapping)
+
+    def render(self, rows):
+        """Yield (row_dict, pdf_bytes) berurutan; paling banyak max_in_flight PDF di memori."""
+        from pdf_report import init_worker, render_in_worker
+
+        # spawn: proses anak tidak mewarisi thread/koneksi worker web
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=ctx,
+                                 initializer=init_worker, initargs=(self.logo_path,)) as ex:
+            pending = deque()
+            for row in rows:
+                pending.append((row, ex.submit(render_in_worker, row)))
+                if len(pending) >= self.max_in_flight:
+                    r, fut = pending.popleft()
+                    yield r, fut.result()
+            while pending:
+                r, fut = pending.popleft()
+                yield r, fut.result()
+
+    def stream_zip(self, dari=None, sampai=None, waktu=None):
+        """Generator potongan byte ZIP (satu PDF per laporan)."""
+        sink = ZipSink()
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zf:
+            for row, pdf in self.render(self.iter_rows(dari, sampai, waktu)):
+                zf.writestr(f"laporan_{row['id']}_{row.get('tanggal') or ''}.pdf", pdf)
+                yield sink.drain()
+        yield sink.drain()
+
+    def merged_pdf(self, dari=None, sampai=None, waktu=None) -> bytes:
+        """Satu PDF gabungan dengan bookmark 'tanggal — #id — TD'."""
+        try:
+            from pypdf import PdfWriter
+        except ImportError:
+            raise RuntimeError("Format PDF gabungan butuh paket 'pypdf'; gunakan format=zip")
+        n = self.count(dari, sampai, waktu)
+        if n > self.max_merge:
+            raise ValueError(f"{n} laporan melebihi batas gabungan {self.max_merge}; gunakan format=zip")
+
+        writer = PdfWriter()
+        for row, pdf in self.render(self.iter_rows(dari, sampai, waktu)):
+            label = f"{row.get('tanggal') or ''} — #{row['id']} — {row.get('nama_td') or ''}"
+            writer.append(io.BytesIO(pdf), outline_item=label)
+        out = io.BytesIO()
+        writer.write(out)
+        return out.getvalue()
@@ -0,0 +1,116 @@
+# pdf_cache.py — cache PDF laporan berbasis isi (content-addressed) di PDF_DIR
+#
+# Nama file: laporan_<id>.<hash>.pdf, dengan hash = sha256(isi baris laporanx + versi
+# template + hash logo). Baris berubah -> hash berubah -> PDF dirender ulang dan versi
+# lama dihapus. Total ukuran dibatasi; yang paling lama tidak diakses dibuang dulu (LRU
+# berdasarkan atime yang kita set sendiri, mtime dipakai sebagai Last-Modified).
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+_CACHE_RE = re.compile(r"^laporan_(?P<id>\d+)\.(?P<hash>[0-9a-f]{16})\.pdf$")
+
+
+def _file_digest(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return "-"
+
+
+class PdfCache:
+    def __init__(self, root: str, template_version: str, fields, logo_path: str = None,
+                 max_bytes: int = 200 * 1024 * 1024):
+        self.root = root
+        # hanya kolom yang dipakai di PDF yang ikut di-hash (status dsb. tidak memicu render ulang)
+        self.fields = tuple(fields)
+        self.max_bytes = max_bytes
+        self.version = f"{template_version}:{_file_digest(logo_path) if logo_path else '-'}"
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def row_hash(self, row_dict: dict) -> str:
+        payload = json.dumps([row_dict.get(k) for k in self.fields], default=str, ensure_ascii=False)
+        return hashlib.sha256(f"{self.version}\n{payload}".encode("utf-8")).hexdigest()[:16]
+
+    def path_for(self, laporan_id: int, digest: str) -> str:
+        return os.path.join(self.root, f"laporan_{laporan_id}.{digest}.pdf")
+
+    def lookup(self, row_dict: dict):
+        """Return (path, etag); path None bila belum ada di cache."""
+        digest = self.row_hash(row_dict)
+        path = self.path_for(row_dict["id"], digest)
+        if os.path.exists(path):
+            self._touch(path)
+            return path, digest
+        return None, digest
+
+    def put(self, row_dict: dict, pdf_bytes: bytes):
+        digest = self.row_hash(row_dict)
+        laporan_id = row_dict["id"]
+        path = self.path_for(laporan_id, digest)
+        fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".pdf", dir=self.root)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp, path)
+        self._drop_other_versions(laporan_id, keep=path)
+        self._evict()
+        return path, digest
+
+    def get_or_build(self, row_dict: dict, builder):
+        path, digest = self.lookup(row_dict)
+        if path:
+            return path, digest
+        return self.put(row_dict, builder(row_dict))
+
+    # ---------- housekeeping ----------
+    @staticmethod
+    def _touch(path: str):
+        try:
+            st = os.stat(path)
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+
+    def _entries(self):
+        out = []
+        with os.scandir(self.root) as it:
+            for e in it:
+                m = _CACHE_RE.match(e.name)
+                if m and e.is_file():
+                    try:
+                        out.append((e.path, int(m.group("id")), e.stat()))
+                    except OSError:
+                        pass
+        return out
+
+    def _drop_other_versions(self, laporan_id: int, keep: str):
+        prefix = f"laporan_{laporan_id}."
+        for path, lid, _ in self._entries():
+            if lid == laporan_id and path != keep and os.path.basename(path).startswith(prefix):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _evict(self):
+        if not self.max_bytes:
+            return
+        with self._lock:
+            entries = self._entries()
+            total = sum(st.st_size for _, _, st in entries)
+            if total <= self.max_bytes:
+                return
+            for path, _, st in sorted(entries, key=lambda x: x[2].st_atime):
+                try:
+                    os.remove(path)
+                    total -= st.st_size
+                except OSError:
+                    pass
+                if total <= self.max_bytes:
+                    break
@@ -0,0 +1,149 @@
+# pdf_render_pool.py — render PDF laporan di proses terpisah (bukan di thread request)
+#
+# Layout ReportLab murni Python dan CPU-bound: di thread gunicorn ia memegang GIL dan
+# memperlambat request lain di worker yang sama. RenderPool menjalankan render di
+# ProcessPoolExecutor (spawn) yang dipanaskan saat start(): ReportLab, font dan logo
+# sudah dimuat lewat pdf_report.init_worker(warm=True).
+#
+#   - antrean dibatasi (max_queue); bila penuh, tunggu paling lama queue_wait detik lalu
+#     RenderBusy (app.py menjawab 503 + Retry-After) — tidak pernah render di thread web
+#   - batas waktu per job (timeout); bila lewat, pool dibuang & dibuat ulang dan baris itu
+#     gagal (RenderTimeout), tidak dicoba lagi inline
+#   - pool rusak (proses anak mati) -> dibuat ulang, dicoba sekali lagi di pool baru; bila
+#     rusak lagi atau pool tidak bisa dibuat sama sekali, render inline (dicatat di log) supaya
+#     PDF tetap bisa diunduh walau lambat
+# Pool dibuat lazy per pid, jadi aman untuk pre-fork gunicorn (sama seperti jobs.JobQueue).
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+log = logging.getLogger(__name__)
+
+
+class RenderBusy(RuntimeError):
+    """Antrean render penuh; coba lagi beberapa detik lagi."""
+
+
+class RenderTimeout(RuntimeError):
+    """Render satu laporan melebihi batas waktu."""
+
+
+class _PoolUnavailable(Exception):
+    """Proses anak tidak bisa dibuat (batas proses/memori, executor sudah ditutup)."""
+
+
+class RenderPool:
+    def __init__(self, logo_path: str, inline_render, workers: int = 1, max_queue: int = 8,
+                 timeout: float = 30.0, queue_wait: float = 5.0):
+        self.logo_path = logo_path
+        self.inline_render = inline_render
+        self.workers = max(0, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.timeout = timeout
+        self.queue_wait = queue_wait
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self.stats = {"pool": 0, "inline": 0, "busy": 0, "timeout": 0, "broken": 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _ensure_executor(self):
+        pid = os.getpid()
+        if self._executor is not None and self._pid == pid:
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                from pdf_report import init_worker, warm_up
+
+                # spawn: proses anak tidak mewarisi thread/koneksi DB worker web
+                ctx = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=ctx,
+                    initializer=init_worker, initargs=(self.logo_path, True),
+                )
+                self._pid = pid
+                # paksa semua proses hidup sekarang, bukan saat PDF pertama diminta
+                for _ in range(self.workers):
+                    self._executor.submit(warm_up)
+        return self._executor
+
+    def start(self):
+        if self.enabled:
+            self._ensure_executor()
+
+    def _reset(self, kill: bool = False):
+        with self._lock:
+            ex, self._executor, self._pid = self._executor, None, None
+        if ex is None:
+            return
+        if kill:
+            # proses yang macet tidak bisa dibatalkan lewat future; hentikan langsung
+            for proc in list(getattr(ex, "_processes", {}).values()):
+                proc.terminate()
+        ex.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _render_inline(self, row_dict: dict) -> bytes:
+        self._count("inline")
+        return self.inline_render(row_dict)
+
+    def _submit(self, row_dict: dict):
+        from pdf_report import render_in_worker
+
+        try:
+            return self._ensure_executor().submit(render_in_worker, row_dict)
+        except BrokenProcessPool:
+            raise
+        except (OSError, RuntimeError) as e:
+            # hanya kegagalan membuat/mengirim ke pool; error render di proses anak tetap naik
+            raise _PoolUnavailable(str(e)) from e
+
+    def render(self, row_dict: dict, block: bool = False) -> bytes:
+        """PDF satu laporan. block=True (thread latar belakang) menunggu slot antrean tanpa
+        batas; request web menunggu paling lama queue_wait lalu RenderBusy."""
+        if not self.enabled:
+            return self.inline_render(row_dict)
+        if not self._slots.acquire(timeout=None if block else self.queue_wait):
+            self._count("busy")
+            raise RenderBusy("Antrean render PDF penuh")
+        try:
+            for attempt in (1, 2):
+                try:
+                    pdf = self._submit(row_dict).result(timeout=self.timeout)
+                except FuturesTimeout:
+                    log.warning("Render PDF laporan %s melebihi %ss; pool dibuat ulang", row_dict.get("id"), self.timeout)
+                    self._count("timeout")
+                    self._reset(kill=True)
+                    raise RenderTimeout(f"Render PDF laporan {row_dict.get('id')} melebihi {self.timeout:g} detik")
+                except BrokenProcessPool:
+                    self._count("broken")
+                    self._reset()
+                    if attempt == 2:
+                        log.error("Pool render PDF rusak lagi; laporan %s dirender inline", row_dict.get("id"))
+                        return self._render_inline(row_dict)
+                    log.warning("Pool render PDF rusak; dibuat ulang")
+                    continue
+                except _PoolUnavailable as e:
+                    log.error("Pool render PDF tidak tersedia (%s); laporan %s dirender inline",
+                              e, row_dict.get("id"))
+                    self._reset()
+                    return self._render_inline(row_dict)
+                self._count("pool")
+                return pdf
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        self._reset()
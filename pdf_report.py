@@ -0,0 +1,209 @@
+# pdf_report.py — template PDF laporan yang disiapkan sekali per proses
+#
+# Style, TableStyle, label slot dan logo dibuat di __init__; render() hanya
+# menyusun data baris laporanx. Logo di-decode sekali per thread (flowable Image
+# menyimpan state canvas saat digambar, jadi tidak dibagi antar thread).
+import io
+import os
+import threading
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import Image as RLImage
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from acara_store import SLOT_HOURS, detect_waktu, only_names
+
+TITLE = "LAPORAN TEKNIS HARIAN"
+
+SLOT_LABELS = {
+    waktu: {slot: f"{jam:02d}.00 - {jam:02d}.59" for slot, jam in hours.items()}
+    for waktu, hours in SLOT_HOURS.items()
+}
+
+
+def safe(s):
+    return "" if s is None else str(s)
+
+
+def esc_html(s: str) -> str:
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _split_or_empty(v):
+    if not v:
+        return []
+    return [s.strip() for s in str(v).split(",") if s is not None]
+
+
+class ReportTemplate:
+    def __init__(self, logo_path: str, fmt_wib):
+        self.fmt_wib = fmt_wib
+        self.styles = getSampleStyleSheet()
+        self.link_style = ParagraphStyle("link", parent=self.styles["Normal"], fontSize=9, leading=12)
+
+        self.logo_bytes = None
+        try:
+            if logo_path and os.path.exists(logo_path):
+                with open(logo_path, "rb") as f:
+                    self.logo_bytes = f.read()
+        except OSError:
+            self.logo_bytes = None  # fallback tanpa logo
+        self._local = threading.local()
+
+        self.header_style = TableStyle([
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("LEFTPADDING", (0, 0), (-1, -1), 0),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+            ("TOPPADDING", (0, 0), (-1, -1), 0),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 0),
+            # tanpa border
+        ])
+        self.grid_style = TableStyle([
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("BOX", (0, 0), (-1, -1), 1, colors.black),
+            ("INNERGRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ])
+        self.grid_header_style = TableStyle([
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("BOX", (0, 0), (-1, -1), 1, colors.black),
+            ("INNERGRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ])
+
+    def _logo(self):
+        """Flowable logo per thread; PNG hanya di-decode sekali per thread."""
+        if not self.logo_bytes:
+            return None
+        logo = getattr(self._local, "logo", None)
+        if logo is None:
+            try:
+                logo = RLImage(io.BytesIO(self.logo_bytes), width=18 * mm, height=15 * mm)  # kecil & rapi
+            except Exception:
+                logo = None
+            self._local.logo = logo
+        return logo
+
+    def linkify(self, url: str):
+        if not url:
+            return Paragraph("-", self.link_style)
+        u = url.strip()
+        display = u if len(u) <= 60 else (u[:57] + "...")
+        return Paragraph(f'<a href="{esc_html(u)}">{esc_html(display)}</a>', self.link_style)
+
+    def render(self, row_dict: dict) -> bytes:
+        styles = self.styles
+        fmt_wib = self.fmt_wib
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        elements = []
+
+        # ---------- Header dengan Logo kiri atas ----------
+        logo_flow = self._logo()
+        if logo_flow:
+            header_tbl = Table(
+                [[logo_flow, Paragraph(TITLE, styles["Heading1"])]],
+                colWidths=[22 * mm, 170 * mm]
+            )
+            header_tbl.setStyle(self.header_style)
+            elements.append(header_tbl)
+            elements.append(Spacer(1, 8))
+        else:
+            elements.append(Paragraph(TITLE, styles["Heading1"]))
+            elements.append(Spacer(1, 12))
+
+        # Identitas
+        identitas = [
+            ["ID", safe(row_dict.get("id"))],
+            ["Timestamp (WIB)", fmt_wib(row_dict.get("timestamp_wib"))],
+            ["Tanggal", fmt_wib(row_dict.get("tanggal"))],
+            ["Petugas TD", safe(row_dict.get("nama_td"))],
+            ["Petugas PDU", safe(row_dict.get("nama_pdu"))],
+            ["Petugas Transmisi", safe(row_dict.get("nama_tx"))],
+        ]
+        t1 = Table(identitas, colWidths=[150, 300])
+        t1.setStyle(self.grid_style)
+        elements.append(Paragraph("Step 1: Identitas Petugas", styles["Heading3"]))
+        elements.append(t1)
+        elements.append(Spacer(1, 12))
+
+        # Bukti
+        bukti = [
+            ["Studio", self.linkify(safe(row_dict.get("studio_link")))],
+            ["Streaming", self.linkify(safe(row_dict.get("streaming_link")))],
+            ["Subcontrol", self.linkify(safe(row_dict.get("subcontrol_link")))],
+        ]
+        t2 = Table(bukti, colWidths=[150, 300])
+        t2.setStyle(self.grid_style)
+        elements.append(Paragraph("Step 2: Bukti (tautan)", styles["Heading3"]))
+        elements.append(t2)
+        elements.append(Spacer(1, 12))
+
+        # ---------- Acara: pilih label jam dinamis (pagi/sore) & tampilkan nama saja ----------
+        a15 = safe(row_dict.get("acara_15"))
+        a16 = safe(row_dict.get("acara_16"))
+        a17 = safe(row_dict.get("acara_17"))
+        a18 = safe(row_dict.get("acara_18"))
+
+        L = SLOT_LABELS.get(detect_waktu(a15, a16, a17, a18), SLOT_LABELS["sore"])
+        acara_rows = [
+            [L["15"], only_names(a15), safe(row_dict.get("format_15"))],
+            [L["16"], only_names(a16), safe(row_dict.get("format_16"))],
+            [L["17"], only_names(a17), safe(row_dict.get("format_17"))],
+            [L["18"], only_names(a18), safe(row_dict.get("format_18"))],
+        ]
+        t3 = Table([["Jam", "Acara", "Format"]] + acara_rows, colWidths=[120, 250, 100])
+        t3.setStyle(self.grid_header_style)
+        elements.append(Paragraph("Step 3: Acara - Acara", styles["Heading3"]))
+        elements.append(t3)
+        elements.append(Spacer(1, 12))
+
+        # Kendala
+        kets = _split_or_empty(row_dict.get("kendala"))
+        wkt = _split_or_empty(row_dict.get("waktu_kendala"))
+        lks = _split_or_empty(row_dict.get("link_kendala"))
+
+        kendalas = []
+        n = max(len(kets), len(wkt), len(lks))
+        for i in range(n):
+            ket = kets[i] if i < len(kets) and kets[i] else "-"
+            wk = wkt[i] if i < len(wkt) and wkt[i] else "-"
+            lk = lks[i] if i < len(lks) and lks[i] else ""
+            kendalas.append([ket, wk, self.linkify(lk) if lk else Paragraph("-", self.link_style)])
+
+        if kendalas:
+            t4 = Table([["Keterangan", "Waktu", "Link"]] + kendalas, colWidths=[200, 100, 200])
+            t4.setStyle(self.grid_header_style)
+            elements.append(Paragraph("Step 4: Kendala - Kendala", styles["Heading3"]))
+            elements.append(t4)
+
+        elements.append(Spacer(1, 12))
+        elements.append(Paragraph(f"Kesimpulan: <b>{safe(row_dict.get('kesimpulan'))}</b>", styles["Heading2"]))
+
+        doc.build(elements)
+        return buffer.getvalue()
+
+
+# ---------- dipakai proses anak (ProcessPoolExecutor) ----------
+_worker_template = None
+
+
+def init_worker(logo_path: str, warm: bool = False):
+    """Initializer proses render: siapkan template sekali per proses.
+    warm=True sekalian render satu PDF kosong agar font & logo sudah dimuat."""
+    global _worker_template
+    from wib import fmt_wib
+    _worker_template = ReportTemplate(logo_path, fmt_wib)
+    if warm:
+        _worker_template.render({"id": 0})
+
+
+def warm_up() -> int:
+    """Job kosong untuk memaksa proses pool hidup; return pid."""
+    return os.getpid()
+
+
+def render_in_worker(row_dict: dict) -> bytes:
+    return _worker_template.render(row_dict)
@@ -0,0 +1,65 @@
+# ref_cache.py — cache per proses untuk data referensi (petugas2, acara)
+#
+# Hasil query disimpan sebagai body JSON siap kirim + ETag kuat (sha256 body) dengan TTL.
+# Invalidasi eksplisit lewat invalidate(): selain mengosongkan cache proses ini, mtime
+# file stamp disentuh sehingga worker gunicorn lain di host yang sama ikut membuang
+# cache-nya pada akses berikutnya (cukup satu os.stat per request).
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class RefCache:
+    def __init__(self, ttl: float = 300.0, stamp_path: str = None):
+        self.ttl = ttl
+        self.stamp_path = stamp_path
+        self._data = {}        # key -> (loaded_at_wall, expires_monotonic, body, etag)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp_mtime(self) -> float:
+        if not self.stamp_path:
+            return 0.0
+        try:
+            return os.stat(self.stamp_path).st_mtime
+        except OSError:
+            return 0.0
+
+    def get(self, key, loader):
+        """Return (body_bytes, etag). loader() dipanggil bila kosong/kedaluwarsa."""
+        now = time.monotonic()
+        stamp = self._stamp_mtime()
+        entry = self._data.get(key)
+        if entry and entry[1] > now and entry[0] >= stamp:
+            self.hits += 1
+            return entry[2], entry[3]
+
+        loaded_at = time.time()
+        body = json.dumps(loader(), default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._data[key] = (loaded_at, now + self.ttl, body, etag)
+            self.misses += 1
+        return body, etag
+
+    def invalidate(self, prefix=None):
+        """Buang cache (semua, atau key tuple yang elemen pertamanya == prefix)."""
+        with self._lock:
+            if prefix is None:
+                self._data.clear()
+            else:
+                for k in [k for k in self._data if (k[0] if isinstance(k, tuple) else k) == prefix]:
+                    del self._data[k]
+        if self.stamp_path:
+            try:
+                with open(self.stamp_path, "a"):
+                    pass
+                os.utime(self.stamp_path, None)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
@@ -0,0 +1,274 @@
+# sheets_outbox.py — antrean (outbox) durable untuk baris Google Sheets
+#
+# Setiap laporan yang selesai diproses dicatat di tabel sheet_outbox (kunci = laporanx.id)
+# dalam transaksi yang sama dengan update laporanx. Thread batcher per worker mengirim
+# antrean dengan satu panggilan append_rows per batch, retry + backoff eksponensial,
+# dan membatasi jumlah request per menit agar tidak kena kuota Sheets.
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+OUTBOX_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS sheet_outbox (
+        laporan_id      INTEGER PRIMARY KEY,
+        created_at      TIMESTAMP NOT NULL DEFAULT now(),
+        attempts        INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT now(),
+        last_error      TEXT,
+        sent_at         TIMESTAMP
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_sheet_outbox_pending
+        ON sheet_outbox (next_attempt_at) WHERE sent_at IS NULL
+    """,
+]
+
+
+def _is_quota_error(exc: Exception) -> bool:
+    resp = getattr(exc, "response", None)
+    return getattr(resp, "status_code", None) == 429
+
+
+class FakeWorksheet:
+    """Pengganti worksheet gspread untuk uji offline (SHEETS_FAKE=1).
+    latency: detik per panggilan; fail_every: gagal tiap panggilan ke-N (0 = tidak pernah)."""
+
+    def __init__(self, latency: float = 0.0, fail_every: int = 0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.fail_every and self.calls % self.fail_every == 0:
+                raise RuntimeError("FakeWorksheet: simulasi kegagalan Sheets")
+            self.rows.extend([list(v) for v in values])
+        return {"updates": {"updatedRows": len(values)}}
+
+    def get_all_values(self):
+        with self._lock:
+            return [[("" if v is None else str(v)) for v in r] for r in self.rows]
+
+
+class SheetsOutbox:
+    def __init__(self, engine, get_worksheet, row_builder,
+                 batch_size: int = 50, flush_interval: float = 2.0,
+                 max_requests_per_min: int = 30, backoff_base: float = 5.0,
+                 backoff_cap: float = 600.0, claim_lease: float = 300.0):
+        self.engine = engine
+        self.get_worksheet = get_worksheet
+        self.row_builder = row_builder
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_requests_per_min = max_requests_per_min
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.claim_lease = claim_lease
+        self._wake = threading.Event()
+        self._sent_at = []          # waktu monotonic request terakhir (rate limit)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    # ---------- enqueue ----------
+    @staticmethod
+    def enqueue(conn, laporan_id: int):
+        """Panggil di dalam transaksi yang sama dengan penulisan laporanx."""
+        conn.execute(
+            text("INSERT INTO sheet_outbox (laporan_id) VALUES (:id) ON CONFLICT (laporan_id) DO NOTHING"),
+            {"id": laporan_id}
+        )
+
+    def notify(self):
+        self._wake.set()
+
+    # ---------- batcher ----------
+    def start(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != pid or not self._thread.is_alive():
+                self._pid = pid
+                self._thread = threading.Thread(target=self._loop, name="sheets-outbox", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                while self.drain_once() == self.batch_size:
+                    pass
+            except Exception:
+                log.exception("Sheets outbox: drain gagal")
+
+    def _wait_for_slot(self):
+        """Token bucket sederhana: maksimal N request Sheets per 60 detik per proses.
+        Hanya menunggu; slot baru terpakai lewat _use_slot saat request benar-benar dikirim."""
+        if not self.max_requests_per_min:
+            return
+        while True:
+            now = time.monotonic()
+            self._sent_at = [t for t in self._sent_at if now - t < 60]
+            if len(self._sent_at) < self.max_requests_per_min:
+                return
+            time.sleep(max(0.05, 60 - (now - self._sent_at[0])))
+
+    def _use_slot(self):
+        if self.max_requests_per_min:
+            self._sent_at.append(time.monotonic())
+
+    def _append(self, values: list):
+        self._wait_for_slot()
+        self._use_slot()
+        with metrics.span("sheets_append_rows"):
+            self.get_worksheet().append_rows(values)
+
+    def _claim(self) -> list:
+        """Ambil satu batch yang jatuh tempo dan tandai sedang dikirim (next_attempt_at digeser
+        sejauh claim_lease), lalu commit: tidak ada lock/koneksi yang ditahan selama request
+        Sheets. Bila proses mati di tengah jalan, baris dikirim ulang setelah lease lewat."""
+        with self.engine.begin() as conn:
+            return conn.execute(text("""
+                WITH due AS (
+                    SELECT laporan_id FROM sheet_outbox
+                    WHERE sent_at IS NULL AND next_attempt_at <= now()
+                    ORDER BY laporan_id
+                    LIMIT :n
+                    FOR UPDATE SKIP LOCKED
+                ), claimed AS (
+                    UPDATE sheet_outbox o
+                    SET next_attempt_at = now() + :lease * interval '1 second'
+                    FROM due
+                    WHERE o.laporan_id = due.laporan_id
+                    RETURNING o.laporan_id
+                )
+                SELECT l.* FROM claimed c JOIN laporanx l ON l.id = c.laporan_id ORDER BY l.id
+            """), {"n": self.batch_size, "lease": self.claim_lease}).fetchall()
+
+    def _record(self, sent: list, failed: list):
+        """sent = [id]; failed = [(id, exc)] -> backoff per baris."""
+        with self.engine.begin() as conn:
+            if sent:
+                conn.execute(
+                    text("UPDATE sheet_outbox SET sent_at = now(), last_error = NULL WHERE laporan_id = ANY(:ids)"),
+                    {"ids": sent}
+                )
+            if failed:
+                # kuota habis -> tunggu minimal 1 menit; lainnya backoff eksponensial
+                conn.execute(text("""
+                    UPDATE sheet_outbox
+                    SET attempts = attempts + 1,
+                        last_error = :err,
+                        next_attempt_at = now() + LEAST(:cap, :base * power(2, attempts)) * interval '1 second'
+                    WHERE laporan_id = :id
+                """), [
+                    {"id": laporan_id, "err": str(e)[:500], "cap": self.backoff_cap,
+                     "base": 60.0 if _is_quota_error(e) else self.backoff_base}
+                    for laporan_id, e in failed
+                ])
+
+    def drain_once(self) -> int:
+        """Kirim satu batch antrean yang sudah jatuh tempo. Return jumlah baris terkirim."""
+        # tunggu kuota dulu, sebelum mengklaim baris
+        self._wait_for_slot()
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        batch, failed = [], []
+        for r in rows:
+            try:
+                batch.append((r.id, self.row_builder(dict(r._mapping))))
+            except Exception as e:
+                failed.append((r.id, e))
+
+        sent = []
+        if batch:
+            try:
+                self._append([v for _, v in batch])
+                sent = [i for i, _ in batch]
+            except Exception as e:
+                log.warning("Sheets outbox: append_rows %d baris gagal: %s", len(batch), e)
+                if _is_quota_error(e) or len(batch) == 1:
+                    failed.extend((i, e) for i, _ in batch)
+                else:
+                    # cari baris yang bermasalah: kirim satu per satu, sisanya tetap terkirim
+                    for laporan_id, value in batch:
+                        try:
+                            self._append([value])
+                            sent.append(laporan_id)
+                        except Exception as e1:
+                            failed.append((laporan_id, e1))
+        if failed:
+            log.warning("Sheets outbox: %d baris gagal (mis. %s)", len(failed), failed[0][1])
+        self._record(sent, failed)
+        return len(sent)
+
+    def drain_all(self) -> int:
+        total = 0
+        while True:
+            n = self.drain_once()
+            total += n
+            if n < self.batch_size:
+                return total
+
+    # ---------- rekonsiliasi ----------
+    @staticmethod
+    def _key(sheet_row) -> tuple:
+        # tanggal, petugas TD, timestamp WIB (kolom terakhir) cukup unik per laporan
+        cells = ["" if v is None else str(v) for v in sheet_row]
+        return (cells[0] if cells else "", cells[1] if len(cells) > 1 else "",
+                cells[19] if len(cells) > 19 else "")
+
+    def find_missing(self, since=None) -> list:
+        """Id laporan selesai yang barisnya tidak ditemukan di Sheet."""
+        present = {self._key(r) for r in self.get_worksheet().get_all_values()}
+
+        sql = "SELECT * FROM laporanx WHERE COALESCE(status_proses, 'selesai') IN ('selesai', 'sebagian')"
+        params = {}
+        if since:
+            sql += " AND tanggal >= :since"
+            params["since"] = since
+        sql += " ORDER BY id"
+
+        with self.engine.connect() as conn:
+            return [
+                r.id for r in conn.execute(text(sql), params)
+                if self._key(self.row_builder(dict(r._mapping))) not in present
+            ]
+
+    def reconcile(self, since=None) -> list:
+        """Antrekan ulang laporan yang belum ada di Sheet. Return daftar id yang diantrekan."""
+        missing = self.find_missing(since=since)
+        if missing:
+            with self.engine.begin() as conn:
+                conn.execute(text("""
+                    INSERT INTO sheet_outbox (laporan_id)
+                    SELECT unnest(CAST(:ids AS INTEGER[]))
+                    ON CONFLICT (laporan_id) DO UPDATE
+                    SET sent_at = NULL, attempts = 0, next_attempt_at = now(), last_error = NULL
+                """), {"ids": missing})
+        return missing
+
+    def pending_count(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT count(*) FROM sheet_outbox WHERE sent_at IS NULL")).scalar() or 0
@@ -0,0 +1,79 @@
+# startup.py — inisialisasi lazy + catatan biaya startup per komponen
+#
+# Klien eksternal (Google Sheets, Cloudinary, template PDF) dibuat saat pertama kali
+# dipakai, bukan saat import app.py. Lazy.get() di-memo per proses dan thread-safe;
+# bila gagal (mis. Sheets tidak terjangkau) error dicatat dan percobaan berikutnya
+# mengulang inisialisasi, jadi worker tetap bisa boot dan melayani request lain.
+import importlib
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+_timings = {}       # nama komponen -> {"kind", "ms", "ok", "error"}
+_timings_lock = threading.Lock()
+
+
+def record(name: str, ms: float, kind: str = "init", ok: bool = True, error: str = None):
+    with _timings_lock:
+        _timings[name] = {"kind": kind, "ms": round(ms, 2), "ok": ok, "error": error}
+
+
+@contextmanager
+def timed(name: str, kind: str = "init"):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record(name, (time.perf_counter() - t0) * 1000.0, kind, ok=False, error=str(e)[:200])
+        raise
+    record(name, (time.perf_counter() - t0) * 1000.0, kind)
+
+
+def import_module(name: str, label: str = None):
+    """importlib.import_module yang mencatat biaya import pertama di proses ini; modul yang
+    sudah dimuat dikembalikan tanpa mengubah catatan."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with timed(label or name, kind="import"):
+        return importlib.import_module(name)
+
+
+def report() -> list:
+    with _timings_lock:
+        return [{"component": k, **v} for k, v in _timings.items()]
+
+
+class Lazy:
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                with timed(self.name):
+                    self._value = self._factory()
+                self._ready = True
+                log.info("Init %s selesai", self.name)
+        return self._value
+
+    __call__ = get
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self._ready = False
@@ -36,7 +36,8 @@ function validateStep(step) {
 // 🔹 Load daftar petugas dari database
 async function loadPetugas() {
   try {
-    const res = await fetch("/api/petugas", { cache: "no-store" });
+    // server mengirim ETag + max-age: biarkan cache HTTP browser bekerja
+    const res = await fetch("/api/petugas");
     const data = await res.json();
 
     // kelompokkan berdasarkan jenis
@@ -168,12 +169,18 @@ function updateSlotHeaders(waktu) {
 }
 
 let ACARA_LIST = []; // cache hasil API
+const ACARA_BY_WAKTU = {}; // toggle pagi/sore tidak perlu fetch ulang di halaman yang sama
 
 async function fetchAcara(waktu = "sore") {
+  if (ACARA_BY_WAKTU[waktu]) {
+    ACARA_LIST = ACARA_BY_WAKTU[waktu];
+    return;
+  }
   try {
-    const res = await fetch(`/api/acara?waktu=${encodeURIComponent(waktu)}`, { cache: "no-store" });
+    const res = await fetch(`/api/acara?waktu=${encodeURIComponent(waktu)}`);
     if (!res.ok) throw new Error("Gagal mengambil data acara");
     ACARA_LIST = await res.json(); // [{id, nama, jenis, waktu}, ...]
+    ACARA_BY_WAKTU[waktu] = ACARA_LIST;
   } catch (e) {
     console.error(e);
     ACARA_LIST = [];
@@ -240,27 +247,163 @@ async function initAcaraCards() {
   });
 }
 
+// 🔹 Pantau status proses laporan (upload, Sheet, PDF dikerjakan server di belakang)
+const STATUS_MAX_ATTEMPTS = 60;   // ± 5 menit
+
+async function pollSubmitStatus(statusUrl, pdfUrl, statusBox, attempt = 0) {
+  if (!statusUrl) {
+    statusBox.innerHTML = `✅ Laporan berhasil disimpan! <br>
+      <a href="${pdfUrl}" target="_blank" class="download-btn">📄 Download PDF</a>`;
+    return;
+  }
+  try {
+    const res = await fetch(statusUrl, { cache: "no-store" });
+    const st = await res.json();
+    if (st.status === "selesai") {
+      statusBox.style.color = "green";
+      statusBox.innerHTML = `✅ Laporan berhasil disimpan! <br>
+        <a href="${st.pdf_url || pdfUrl}" target="_blank" class="download-btn">📄 Download PDF</a>`;
+      if (st.message) {
+        const warn = document.createElement("div");
+        warn.style.color = "orange";
+        warn.innerText = "⚠️ " + st.message;
+        statusBox.appendChild(warn);
+      }
+      return;
+    }
+    if (st.status === "gagal") {
+      statusBox.style.color = "red";
+      statusBox.innerText = "Laporan tersimpan, tetapi proses gagal: " + (st.message || "");
+      return;
+    }
+  } catch (err) {
+    // jaringan putus sebentar: coba lagi
+  }
+  if (attempt + 1 >= STATUS_MAX_ATTEMPTS) {
+    statusBox.style.color = "";
+    statusBox.innerHTML = `⏳ Laporan tersimpan dan masih diproses. Cek lagi nanti: <br>
+      <a href="${pdfUrl}" target="_blank" class="download-btn">📄 Download PDF</a>`;
+    return;
+  }
+  const delay = Math.min(1000 * (attempt + 1), 5000);
+  setTimeout(() => pollSubmitStatus(statusUrl, pdfUrl, statusBox, attempt + 1), delay);
+}
+
+// 🔹 Upload foto bukti per potong (resumable) sebelum submit
+const uploadedFiles = new WeakMap(); // File -> {upload_id, offset, chunk_size}
+
+async function uploadInChunks(file, field, onProgress) {
+  let state = uploadedFiles.get(file);
+  if (state) {
+    // submit diulang: lanjutkan dari offset yang sudah diterima server
+    const res = await fetch(`/api/uploads/${state.upload_id}`, { cache: "no-store" });
+    if (res.ok) {
+      Object.assign(state, await res.json());
+    } else {
+      uploadedFiles.delete(file);   // kedaluwarsa / sudah dipakai -> mulai baru
+      state = null;
+    }
+  }
+  if (!state) {
+    const res = await fetch("/api/uploads", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ filename: file.name, size: file.size, field }),
+    });
+    if (!res.ok) throw new Error(`upload ${field}: HTTP ${res.status}`);
+    state = await res.json();
+    uploadedFiles.set(file, state);
+  }
+
+  let offset = state.offset || 0;
+  let failures = 0;
+  while (offset < file.size) {
+    try {
+      const res = await fetch(`/api/uploads/${state.upload_id}`, {
+        method: "PATCH",
+        headers: { "Upload-Offset": String(offset), "Content-Type": "application/octet-stream" },
+        body: file.slice(offset, offset + state.chunk_size),
+      });
+      const st = await res.json();
+      // 409 = server punya offset lain (potongan sebelumnya ternyata sampai): ikuti server
+      if (!res.ok && res.status !== 409) throw new Error(st.error || `HTTP ${res.status}`);
+      offset = st.offset;
+      failures = 0;
+      if (onProgress) onProgress(offset / file.size);
+    } catch (err) {
+      if (++failures > 5) throw err;
+      await new Promise(r => setTimeout(r, 1000 * failures));
+      const res = await fetch(`/api/uploads/${state.upload_id}`, { cache: "no-store" }).catch(() => null);
+      if (res && res.ok) offset = (await res.json()).offset;
+    }
+  }
+  state.offset = offset;
+  return state.upload_id;
+}
+
+// File di form diganti upload_id; /submit hanya membawa field teks
+async function stageUploads(form, formData, statusBox) {
+  const jobs = [];
+  ["studio", "streaming", "subcontrol"].forEach(key => {
+    const input = form.querySelector(`#bukti_${key}`);
+    if (input && input.files[0]) jobs.push({ file: input.files[0], field: key, name: `bukti_${key}` });
+  });
+  const kendalaInputs = [...form.querySelectorAll('input[name="kendala_foto[]"]')];
+  kendalaInputs.forEach((input, i) => {
+    if (input.files[0]) jobs.push({ file: input.files[0], field: "kendala", index: i });
+  });
+
+  const kendalaIds = kendalaInputs.map(() => "");
+  for (let n = 0; n < jobs.length; n++) {
+    const job = jobs[n];
+    const id = await uploadInChunks(job.file, job.field, p => {
+      statusBox.innerHTML = `⏳ Mengunggah foto ${n + 1}/${jobs.length} (${Math.round(p * 100)}%)`;
+    });
+    if (job.field === "kendala") {
+      kendalaIds[job.index] = id;
+    } else {
+      formData.delete(job.name);
+      formData.set(`${job.name}_upload_id`, id);
+    }
+  }
+  formData.delete("kendala_foto[]");
+  kendalaIds.forEach(id => formData.append("kendala_upload_id[]", id));
+}
+
+// 🔹 Kunci idempoten: sama untuk semua percobaan kirim satu laporan, baru setelah berhasil
+let submitKey = null;
+function newSubmitKey() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 12);
+}
+
 // 🔹 Submit via AJAX
 document.getElementById("reportForm").addEventListener("submit", async function (e) {
   e.preventDefault();
 
+  if (!submitKey) submitKey = newSubmitKey();
   const formData = new FormData(this);
+  formData.set("idempotency_key", submitKey);
   const submitBtn = this.querySelector('button[type="submit"]');
   submitBtn.disabled = true;
   submitBtn.innerHTML = `<span class="spinner"></span> Mengirim...`;
 
   try {
-    const res = await fetch("/submit", { method: "POST", body: formData });
+    await stageUploads(this, formData, document.getElementById("statusMessage"));
+    const res = await fetch("/submit", {
+      method: "POST",
+      body: formData,
+      headers: { "Idempotency-Key": submitKey },
+    });
     const result = await res.json();
 
     const statusBox = document.getElementById("statusMessage");
     statusBox.style.color = result.status === "success" ? "green" : "red";
 
     if (result.status === "success") {
-      statusBox.innerHTML = `
-        ✅ ${result.message} <br>
-        <a href="${result.pdf_url}" target="_blank" class="download-btn">📄 Download PDF</a>
-      `;
+      statusBox.innerHTML = `⏳ ${result.message}`;
+      pollSubmitStatus(result.status_url, result.pdf_url, statusBox);
+      submitKey = null;
       this.reset();
       currentStep = 1;
       showStep(currentStep);
@@ -0,0 +1,47 @@
+# upload_dedup.py — dedup upload foto bukti berdasarkan isi file
+#
+# Public id Cloudinary diturunkan dari sha256 file mentah (h_<32 hex>), dan URL hasil upload
+# dicatat di tabel cloudinary_uploads per (hash, folder). Foto yang sama (submit ulang,
+# foto dipakai di dua laporan) tidak dikompres atau di-upload lagi. Folder ikut jadi kunci
+# karena tiap folder punya profil kompresi sendiri (IMAGE_PROFILES di app.py).
+import hashlib
+
+from sqlalchemy import text
+
+UPLOADS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS cloudinary_uploads (
+        content_hash TEXT      NOT NULL,
+        folder       TEXT      NOT NULL,
+        url          TEXT      NOT NULL,
+        created_at   TIMESTAMP NOT NULL DEFAULT now(),
+        PRIMARY KEY (content_hash, folder)
+    )
+    """,
+]
+
+
+def file_digest(path: str, chunk: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def public_id_for(digest: str) -> str:
+    return f"h_{digest[:32]}"
+
+
+def lookup(conn, digest: str, folder: str):
+    return conn.execute(
+        text("SELECT url FROM cloudinary_uploads WHERE content_hash = :h AND folder = :f"),
+        {"h": digest, "f": folder},
+    ).scalar()
+
+
+def remember(conn, digest: str, folder: str, url: str):
+    conn.execute(text("""
+        INSERT INTO cloudinary_uploads (content_hash, folder, url) VALUES (:h, :f, :u)
+        ON CONFLICT (content_hash, folder) DO NOTHING
+    """), {"h": digest, "f": folder, "u": url})
@@ -0,0 +1,32 @@
+# wib.py — util waktu WIB (dipakai app, admin_api, dan proses render PDF)
+# Fallback tanpa paket tambahan (UTC+7) jika zoneinfo tak tersedia
+from datetime import datetime, date, timezone, timedelta
+
+try:
+    # Python 3.9+ (preferred)
+    from zoneinfo import ZoneInfo
+    TZ_WIB = ZoneInfo("Asia/Makassar")
+except Exception:
+    # Fallback tanpa paket eksternal: offset tetap UTC+7
+    TZ_WIB = timezone(timedelta(hours=7))
+
+def now_wib_minute_aw() -> datetime:
+    return datetime.now(timezone.utc).astimezone(TZ_WIB).replace(second=0, microsecond=0)
+
+def to_naive_wib(dt_aw: datetime) -> datetime:
+    if dt_aw is None:
+        return None
+    if dt_aw.tzinfo is None:
+        return dt_aw.replace(second=0, microsecond=0)
+    return dt_aw.astimezone(TZ_WIB).replace(tzinfo=None, second=0, microsecond=0)
+
+def fmt_wib(x) -> str:
+    if x is None:
+        return ""
+    if isinstance(x, datetime):
+        if x.tzinfo is None:
+            return x.strftime("%Y-%m-%d %H:%M")
+        return x.astimezone(TZ_WIB).strftime("%Y-%m-%d %H:%M")
+    if isinstance(x, date):
+        return x.strftime("%Y-%m-%d")
+    return str(x)